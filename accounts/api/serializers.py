@@ -2,6 +2,7 @@ from django.contrib.auth.models import User
 from rest_framework import exceptions, serializers
 
 from accounts.models import UserProfile
+from accounts.services import UserService
 
 
 class UserSerializer(serializers.HyperlinkedModelSerializer):
@@ -14,6 +15,10 @@ class UserSerializerWithProfile(UserSerializer):
     nickname = serializers.CharField(source="profile.nickname")
     avatar_url = serializers.SerializerMethodField()
 
+    def prime(self, users):
+        # called by the parent serializers with the users of a whole page
+        UserService.prime_profiles(users)
+
     def get_avatar_url(self, obj):
         if obj.profile.avatar:
             return obj.profile.avatar.url
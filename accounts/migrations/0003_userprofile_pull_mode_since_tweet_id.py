@@ -0,0 +1,17 @@
+# Generated by Django 3.1.3 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0002_auto_20220531_0626"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="pull_mode_since_tweet_id",
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -13,6 +13,9 @@ class UserProfile(models.Model):
     avatar = models.FileField(null=True)
 
     nickname = models.CharField(null=True, max_length=200)
+    # the first tweet not fanned out, set when the account enters pull mode,
+    # null if it is not in pull mode. cached in redis by NewsFeedServices
+    pull_mode_since_tweet_id = models.IntegerField(null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -3,6 +3,7 @@ from django.core.cache import caches
 
 from accounts.models import UserProfile
 from twitter.cache import USER_PROFILE_PATTERN
+from utils.identity_map import IdentityMap
 
 cache = caches["testing"] if settings.TESTING_MODE else caches["default"]
 
@@ -10,18 +11,21 @@ cache = caches["testing"] if settings.TESTING_MODE else caches["default"]
 class UserService:
     @classmethod
     def get_profile_through_cache(cls, user_id):
+        # loaded before in the same request, the profiles are mapped by user id
+        profile = IdentityMap.get(USER_PROFILE_PATTERN, user_id)
+        if profile is not None:
+            return profile
+
         key = USER_PROFILE_PATTERN.format(user_id=user_id)
 
         # Read from cache
         profile = cache.get(key)
 
-        # Cache hit return
-        if profile is not None:
-            return profile
-
         # Cache miss, read from db
-        profile, _ = UserProfile.objects.get_or_create(user_id=user_id)
-        cache.set(key, profile)
+        if profile is None:
+            profile, _ = UserProfile.objects.get_or_create(user_id=user_id)
+            cache.set(key, profile)
+        IdentityMap.set(USER_PROFILE_PATTERN, user_id, profile)
         return profile
 
     @classmethod
@@ -29,3 +33,62 @@ class UserService:
         # When user change the password, then delete the user,key
         key = USER_PROFILE_PATTERN.format(user_id=user_id)
         cache.delete(key)
+        IdentityMap.discard(USER_PROFILE_PATTERN, user_id)
+
+    @classmethod
+    def get_profiles_through_cache(cls, user_ids):
+        # return {user_id: profile}, one get_many for all the users, one query
+        # for the cache misses, and one bulk_create for the missing profiles
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        profiles = IdentityMap.get_many(USER_PROFILE_PATTERN, user_ids)
+        keys = {
+            USER_PROFILE_PATTERN.format(user_id=user_id): user_id
+            for user_id in user_ids - profiles.keys()
+        }
+        if keys:
+            cached_profiles = cache.get_many(keys.keys())
+            profiles.update({keys[key]: obj for key, obj in cached_profiles.items()})
+
+        missed_ids = user_ids - profiles.keys()
+        if missed_ids:
+            missed_profiles = {
+                profile.user_id: profile
+                for profile in UserProfile.objects.filter(user_id__in=missed_ids)
+            }
+            new_ids = missed_ids - missed_profiles.keys()
+            if new_ids:
+                UserProfile.objects.bulk_create(
+                    [UserProfile(user_id=user_id) for user_id in new_ids],
+                    ignore_conflicts=True,
+                )
+                # bulk_create does not set the ids on mysql, read them back
+                missed_profiles.update(
+                    {
+                        profile.user_id: profile
+                        for profile in UserProfile.objects.filter(user_id__in=new_ids)
+                    }
+                )
+            cache.set_many(
+                {
+                    USER_PROFILE_PATTERN.format(user_id=user_id): profile
+                    for user_id, profile in missed_profiles.items()
+                }
+            )
+            profiles.update(missed_profiles)
+        IdentityMap.set_many(USER_PROFILE_PATTERN, profiles)
+        return profiles
+
+    @classmethod
+    def prime_profiles(cls, users):
+        # load the profiles of the users in bulk and keep them in
+        # user._cached_user_profile, which User.profile reads
+        users = [
+            user
+            for user in users
+            if user is not None and not hasattr(user, "_cached_user_profile")
+        ]
+        if not users:
+            return
+        profiles = cls.get_profiles_through_cache([user.id for user in users])
+        for user in users:
+            setattr(user, "_cached_user_profile", profiles.get(user.id))
@@ -1,4 +1,7 @@
+from django.contrib.auth.models import User
+
 from accounts.models import UserProfile
+from accounts.services import UserService
 from testing.testcases import TestCase
 
 
@@ -13,3 +16,23 @@ class UserProfileTests(TestCase):
         profile = user1.profile
         self.assertEqual(isinstance(profile, UserProfile), True)
         self.assertEqual(UserProfile.objects.count(), 1)
+
+    def test_get_profiles_through_cache(self):
+        users = [self.create_user(f"user{i}", f"user{i}@example.com") for i in range(3)]
+        UserProfile.objects.create(user=users[0], nickname="nickname0")
+        user_ids = [user.id for user in users]
+
+        # the missing profiles are created in bulk
+        profiles = UserService.get_profiles_through_cache(user_ids)
+        self.assertEqual(set(profiles), set(user_ids))
+        self.assertEqual(profiles[users[0].id].nickname, "nickname0")
+        self.assertEqual(UserProfile.objects.count(), 3)
+
+        # all cached
+        users = list(User.objects.filter(id__in=user_ids))
+        with self.assertNumQueries(0):
+            UserService.prime_profiles(users)
+            self.assertEqual(
+                [user.profile.user_id for user in users],
+                [user.id for user in users],
+            )
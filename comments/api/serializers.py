@@ -1,13 +1,16 @@
+from django.contrib.auth.models import User
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from accounts.api.serializers import UserSerializerForComment
 from comments.models import Comment
-from likes.services import LikeService
+from likes.api.serializers import HasLikedMixin
 from tweets.models import Tweet
+from utils.memcached_helper import MemcachedHelper
+from utils.serializers import CachedCountsMixin, PrimedListSerializer
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(serializers.ModelSerializer, HasLikedMixin, CachedCountsMixin):
     user = UserSerializerForComment(source="cached_user")
     likes_count = serializers.SerializerMethodField()
     has_liked = serializers.SerializerMethodField()
@@ -23,12 +26,16 @@ class CommentSerializer(serializers.ModelSerializer):
             "likes_count",
             "has_liked",
         )
+        list_serializer_class = PrimedListSerializer
 
-    def get_likes_count(self, obj):
-        return obj.like_set.count()
+    def prime(self, comments):
+        MemcachedHelper.prime_cached_objects(comments, User, "user_id", "_cached_user")
+        self.fields["user"].prime([comment.cached_user for comment in comments])
+        self.prime_has_liked(comments)
+        self.prime_counts(comments, "likes_count")
 
-    def get_has_liked(self, obj):
-        return LikeService.has_liked(self.context["request"].user, obj)
+    def get_likes_count(self, obj):
+        return self.get_cached_count(obj, "likes_count")
 
 
 class CommentSerializerForCreate(serializers.ModelSerializer):
@@ -1,8 +1,19 @@
+import re
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework.test import APIClient
 
 from comments.models import Comment
+from comments.services import CommentService
 from testing.testcases import TestCase
+from twitter.cache import TWEET_COMMENTS_PATTERN
+from utils.paginations import EndlessPagination
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
 
 COMMENT_URL = "/api/comments/"
 TWEET_DETAIL_API = "/api/tweets/{}/"
@@ -131,7 +142,7 @@ class CommentApiTests(TestCase):
         )
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data["comments"]), 0)
+        self.assertEqual(len(response.data["results"]), 0)
 
         # comments filterd by date
         self.create_comment(self.user1, self.tweet, "1")
@@ -143,9 +154,9 @@ class CommentApiTests(TestCase):
                 "tweet_id": self.tweet.id,
             },
         )
-        self.assertEqual(len(response.data["comments"]), 2)
-        self.assertEqual(response.data["comments"][0]["content"], "1")
-        self.assertEqual(response.data["comments"][1]["content"], "2")
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(response.data["results"][0]["content"], "2")
+        self.assertEqual(response.data["results"][1]["content"], "1")
 
         # if user_id and tweet_id were both filterd, only tweet_id can be filterd
         response = self.anonymous_client.get(
@@ -155,7 +166,7 @@ class CommentApiTests(TestCase):
                 "user_id": self.user1.id,
             },
         )
-        self.assertEqual(len(response.data["comments"]), 2)
+        self.assertEqual(len(response.data["results"]), 2)
 
     def test_comments_count(self):
         """test the comments count in tweet detail, tweet list, newsfeed list"""
@@ -212,3 +223,78 @@ class CommentApiTests(TestCase):
         response = self.user2_client.get(NEWSFEED_LIST_API)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data["results"][0]["tweet"]["comments_count"], 2)
+
+    def test_list_with_cache(self):
+        comments = [
+            self.create_comment(self.user1, self.tweet, f"comment{i}")
+            for i in range(EndlessPagination.page_size + 2)
+        ]
+        comments = comments[::-1]
+        response = self.user2_client.get(COMMENT_URL, {"tweet_id": self.tweet.id})
+        self.assertEqual(
+            [comment["id"] for comment in response.data["results"]],
+            [comment.id for comment in comments[: EndlessPagination.page_size]],
+        )
+        self.assertEqual(response.data["has_next_page"], True)
+
+        # the comments are served from the cached list with a fixed number of
+        # queries, whatever the page size is
+        with self.assertNumQueries(3):
+            response = self.user2_client.get(
+                COMMENT_URL,
+                {
+                    "tweet_id": self.tweet.id,
+                    "cursor": response.data["next_cursor"],
+                },
+            )
+        self.assertEqual(
+            [comment["id"] for comment in response.data["results"]],
+            [comment.id for comment in comments[EndlessPagination.page_size :]],
+        )
+
+        # the cached list is changed by create and delete
+        comments[0].delete()
+        new_comment = self.create_comment(self.user2, self.tweet, "new comment")
+        response = self.user2_client.get(COMMENT_URL, {"tweet_id": self.tweet.id})
+        self.assertEqual(response.data["results"][0]["id"], new_comment.id)
+        self.assertEqual(response.data["results"][1]["id"], comments[1].id)
+
+    def assert_comment_queries_bounded(self, queries):
+        # the queries of the comments of the tweet, not the ones by ids
+        comment_queries = [
+            query["sql"]
+            for query in queries
+            if 'WHERE "comments_comment"."tweet_id"' in query["sql"]
+        ]
+        self.assertTrue(comment_queries)
+        for sql in comment_queries:
+            limit = re.search(r"LIMIT (\d+)", sql)
+            self.assertIsNotNone(limit, sql)
+            self.assertLessEqual(int(limit.group(1)), settings.REDIS_LIST_LENGTH_LIMIT)
+
+    def test_list_cache_miss_is_bounded(self):
+        list_limit = settings.REDIS_LIST_LENGTH_LIMIT
+        for i in range(list_limit + 3):
+            self.create_comment(self.user1, self.tweet, f"comment{i}")
+        self.clear_cache()
+
+        # a cache miss loads at most the length limit of the cached list
+        with CaptureQueriesContext(connection) as captured:
+            response = self.user2_client.get(COMMENT_URL, {"tweet_id": self.tweet.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), EndlessPagination.page_size)
+        self.assert_comment_queries_bounded(captured.captured_queries)
+        self.assertEqual(
+            len(CommentService.get_cached_comments(self.tweet.id)), list_limit
+        )
+
+        # so does the fallback when another request is loading the list
+        key = TWEET_COMMENTS_PATTERN.format(tweet_id=self.tweet.id)
+        conn = RedisClient.get_connection()
+        conn.delete(key)
+        conn.set(RedisHelper.get_fill_lock_key(key), "token")
+        with patch.object(RedisHelper, "_wait_for_fill"):
+            with CaptureQueriesContext(connection) as captured:
+                comments = CommentService.get_cached_comments(self.tweet.id)
+        self.assertEqual(len(comments), list_limit)
+        self.assert_comment_queries_bounded(captured.captured_queries)
@@ -8,8 +8,10 @@ from comments.api.serializers import (
     CommentSerializerForUpdate,
 )
 from comments.models import Comment
+from comments.services import CommentService
 from inbox.services import NotificationService
 from utils.decorators import required_params
+from utils.paginations import EndlessPagination
 from utils.permissions import IsObjectOwner
 
 
@@ -22,6 +24,7 @@ class CommentViewSet(viewsets.GenericViewSet):
     serializer_class = CommentSerializerForCreate
     queryset = Comment.objects.all()
     filterset_fields = ("tweet_id",)
+    pagination_class = EndlessPagination
 
     def get_permissions(self):
         # 注意要加用 AllowAny() / IsAuthenticated() 实例化出对象
@@ -44,11 +47,15 @@ class CommentViewSet(viewsets.GenericViewSet):
             )
 
         tweet_id = request.query_params["tweet_id"]
-        comments = Comment.objects.filter(tweet_id=tweet_id)
-        serializer = CommentSerializer(
-            comments, context={"request": request}, many=True
-        )
-        return Response({"comments": serializer.data}, status=status.HTTP_200_OK)
+        cached_comments = CommentService.get_cached_comments(tweet_id)
+        page = self.paginator.paginate_cached_list(cached_comments, request)
+        if page is None:
+            queryset = Comment.objects.filter(tweet_id=tweet_id)
+            page = self.paginate_queryset(queryset)
+        else:
+            page = CommentService.load_comments(page)
+        serializer = CommentSerializer(page, context={"request": request}, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         data = {
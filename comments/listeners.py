@@ -1,3 +1,5 @@
+from django.conf import settings
+
 from utils.listeners import invalidate_object_cache
 from utils.redis_helper import RedisHelper
 
@@ -11,9 +13,11 @@ def increase_comments_count(sender, instance, created, **kwargs):
         return
 
     # handle new comment
-    Tweet.objects.filter(id=instance.tweet_id).update(
-        comments_count=F("comments_count") + 1
-    )
+    # in write-behind mode the db is updated by flush_count_deltas_task
+    if not settings.COUNTERS_WRITE_BEHIND:
+        Tweet.objects.filter(id=instance.tweet_id).update(
+            comments_count=F("comments_count") + 1
+        )
     RedisHelper.increase_count(instance.tweet, "comments_count")
 
 
@@ -22,7 +26,23 @@ def decrease_comments_count(sender, instance, **kwargs):
 
     from tweets.models import Tweet
 
-    Tweet.objects.filter(id=instance.tweet_id).update(
-        comments_count=F("comments_count") - 1
-    )
+    if not settings.COUNTERS_WRITE_BEHIND:
+        Tweet.objects.filter(id=instance.tweet_id).update(
+            comments_count=F("comments_count") - 1
+        )
     RedisHelper.decrease_count(instance.tweet, "comments_count")
+
+
+def push_comment_to_cache(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    from comments.services import CommentService
+
+    CommentService.push_comment_to_cache(instance)
+
+
+def invalidate_cached_comments(sender, instance, **kwargs):
+    from comments.services import CommentService
+
+    CommentService.invalidate_cached_comments(instance.tweet_id)
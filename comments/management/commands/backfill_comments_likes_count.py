@@ -0,0 +1,76 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from comments.models import Comment
+from likes.models import Like
+from utils.redis_helper import RedisHelper
+
+
+class Command(BaseCommand):
+    """
+    Django command to fill Comment.likes_count of the existing comments.
+    Pause the likes of the comments while it runs: the recount is not atomic
+    with the likes created meanwhile, whose counts and write-behind deltas may
+    be lost or counted twice.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="number of comments updated in one batch",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        content_type = ContentType.objects.get_for_model(Comment)
+        # hold the flush lock all along, so that the write-behind deltas of the
+        # recounted comments are not applied again on top of their counts
+        token = RedisHelper.acquire_flush_lock()
+        if token is None:
+            raise CommandError("The count deltas are being flushed, try again later.")
+        try:
+            RedisHelper.apply_count_deltas()
+            updated_count = self.backfill(content_type, batch_size, token)
+        finally:
+            RedisHelper.release_flush_lock(token)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{updated_count} comments likes_count backfilled.")
+        )
+
+    def backfill(self, content_type, batch_size, token):
+        last_id, updated_count = 0, 0
+        while True:
+            if not RedisHelper.extend_flush_lock(token):
+                raise CommandError("Lost the flush lock, run the command again.")
+            # walk through the comments by the primary key, batch by batch
+            comment_ids = list(
+                Comment.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not comment_ids:
+                break
+            last_id = comment_ids[-1]
+
+            likes_counts = dict(
+                Like.objects.filter(
+                    content_type=content_type,
+                    object_id__in=comment_ids,
+                )
+                .values_list("object_id")
+                .annotate(count=Count("id"))
+            )
+            comments = [
+                Comment(id=comment_id, likes_count=likes_counts.get(comment_id, 0))
+                for comment_id in comment_ids
+            ]
+            Comment.objects.bulk_update(comments, ["likes_count"])
+            # the deltas logged for these likes are in the db counts now, drop
+            # them with the counters cached or loaded before the update
+            RedisHelper.discard_count_deltas(Comment, comment_ids, "likes_count")
+            updated_count += len(comments)
+        return updated_count
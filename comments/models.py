@@ -1,11 +1,17 @@
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.db.models.signals import post_save, pre_delete
-
-from comments.listeners import decrease_comments_count, increase_comments_count
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from comments.listeners import (
+    decrease_comments_count,
+    increase_comments_count,
+    invalidate_cached_comments,
+    push_comment_to_cache,
+)
 from likes.models import Like
 from tweets.models import Tweet
+from utils.listeners import invalidate_object_cache
 from utils.memcached_helper import MemcachedHelper
 
 
@@ -16,6 +22,9 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # denormalization, set null=True to not rewrite the old rows when migrating
+    likes_count = models.IntegerField(default=0, null=True)
+
     class Meta:
         index_together = [
             ("tweet", "created_at"),
@@ -35,8 +44,14 @@ class Comment(models.Model):
 
     @property
     def cached_user(self):
+        if hasattr(self, "_cached_user"):
+            return self._cached_user
         return MemcachedHelper.get_object_through_cache(User, self.user_id)
 
 
 post_save.connect(increase_comments_count, sender=Comment)
 pre_delete.connect(decrease_comments_count, sender=Comment)
+post_save.connect(push_comment_to_cache, sender=Comment)
+post_delete.connect(invalidate_cached_comments, sender=Comment)
+post_save.connect(invalidate_object_cache, sender=Comment)
+pre_delete.connect(invalidate_object_cache, sender=Comment)
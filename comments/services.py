@@ -0,0 +1,52 @@
+from comments.models import Comment
+from twitter.cache import TWEET_COMMENTS_PATTERN
+from utils.memcached_helper import MemcachedHelper
+from utils.redis_helper import RedisHelper
+
+
+class CommentService:
+    @classmethod
+    def get_cached_comments(cls, tweet_id):
+        # Queryset is lazy loading
+        queryset = Comment.objects.filter(tweet_id=tweet_id).order_by(
+            "-created_at", "-id"
+        )
+        key = TWEET_COMMENTS_PATTERN.format(tweet_id=tweet_id)
+        return RedisHelper.load_objects(key, queryset)
+
+    @classmethod
+    def get_first_comments(cls, tweet_id, size):
+        # the newest comments of the tweet, from the cached list if it is
+        # cached, otherwise only size comments are read from db
+        queryset = Comment.objects.filter(tweet_id=tweet_id).order_by(
+            "-created_at", "-id"
+        )
+        key = TWEET_COMMENTS_PATTERN.format(tweet_id=tweet_id)
+        return RedisHelper.load_first_objects(key, queryset, size)
+
+    @classmethod
+    def push_comment_to_cache(cls, comment):
+        queryset = Comment.objects.filter(tweet_id=comment.tweet_id).order_by(
+            "-created_at", "-id"
+        )
+        key = TWEET_COMMENTS_PATTERN.format(tweet_id=comment.tweet_id)
+        RedisHelper.push_object(key, comment, queryset)
+
+    @classmethod
+    def invalidate_cached_comments(cls, tweet_id):
+        key = TWEET_COMMENTS_PATTERN.format(tweet_id=tweet_id)
+        RedisHelper.invalidate_objects(key)
+
+    @classmethod
+    def load_comments(cls, comments):
+        # the cached comments only have the ids, load the comments of a page
+        # with one memcached get_many and one db query for the cache misses
+        comment_by_id = MemcachedHelper.get_objects_through_cache(
+            Comment,
+            [comment.id for comment in comments],
+        )
+        return [
+            comment_by_id[comment.id]
+            for comment in comments
+            if comment.id in comment_by_id
+        ]
@@ -1,4 +1,13 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from comments.models import Comment
 from testing.testcases import TestCase
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
 
 
 class CommentModelTests(TestCase):
@@ -24,3 +33,58 @@ class CommentModelTests(TestCase):
         user2 = self.create_user("user2", "user2@gmail.com")
         self.create_like(user2, self.comment)
         self.assertEqual(self.comment.like_set.count(), 2)
+
+    def test_likes_count(self):
+        self.create_like(self.user1, self.comment)
+        user2 = self.create_user("user2", "user2@gmail.com")
+        like = self.create_like(user2, self.comment)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 2)
+        self.assertEqual(RedisHelper.get_count(self.comment, "likes_count"), 2)
+
+        like.delete()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 1)
+        self.assertEqual(RedisHelper.get_count(self.comment, "likes_count"), 1)
+
+    def test_backfill_comments_likes_count(self):
+        comments = [self.create_comment(self.user1, self.tweet) for _ in range(2)]
+        self.create_like(self.user1, comments[0])
+        self.create_like(self.user1, self.comment)
+        Comment.objects.update(likes_count=0)
+        RedisClient.clear()
+
+        out = StringIO()
+        call_command("backfill_comments_likes_count", batch_size=2, stdout=out)
+        self.assertIn("3 comments likes_count backfilled.", out.getvalue())
+        self.assertEqual(
+            list(Comment.objects.order_by("id").values_list("likes_count", flat=True)),
+            [1, 1, 0],
+        )
+
+    @override_settings(COUNTERS_WRITE_BEHIND=True)
+    def test_backfill_comments_likes_count_with_pending_deltas(self):
+        self.create_like(self.user1, self.comment)
+        # the delta is pending, the db count is not changed yet
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 0)
+        RedisHelper.apply_count_deltas()
+        self.create_like(self.create_user("user2", "user2@gmail.com"), self.comment)
+
+        # the second delta is logged after the command applied the deltas
+        key = RedisHelper.get_count_key(self.comment, "likes_count")
+        version_key = RedisHelper.get_count_version_key(key)
+        conn = RedisClient.get_connection()
+        version = int(conn.get(version_key) or 0)
+        with patch.object(RedisHelper, "apply_count_deltas"):
+            call_command("backfill_comments_likes_count", stdout=StringIO())
+        # the counter loaded before the recount is not cached
+        self.assertFalse(conn.exists(key))
+        self.assertEqual(int(conn.get(version_key)), version + 1)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 2)
+        # the recounted deltas are not applied again
+        self.assertEqual(RedisHelper.flush_count_deltas(), 0)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 2)
+        self.assertEqual(RedisHelper.get_count(self.comment, "likes_count"), 2)
@@ -0,0 +1,57 @@
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tweets.models import Tweet
+from utils.redis_serializers import SERIALIZERS
+from utils.time_helpers import utc_now
+
+
+class Command(BaseCommand):
+    """Django command to compare the serializers of the redis cached lists"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=settings.REDIS_LIST_LENGTH_LIMIT,
+            help="number of tweets in the cached list",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=100,
+            help="number of times to decode the list",
+        )
+
+    def handle(self, *args, **options):
+        size, repeat = options["size"], options["repeat"]
+        now = utc_now()
+        tweets = [
+            Tweet(
+                id=index + 1,
+                user_id=index % 10 + 1,
+                content=f"tweet content number {index}",
+                created_at=now,
+                likes_count=index,
+                comments_count=index,
+            )
+            for index in range(size)
+        ]
+
+        self.stdout.write(f"Cached list of {size} tweets, decoded {repeat} times")
+        for name, serializer in SERIALIZERS.items():
+            serialized_list = [serializer.serialize(tweet) for tweet in tweets]
+            total_bytes = sum(len(data) for data in serialized_list)
+            seconds = timeit.timeit(
+                lambda: [
+                    serializer.deserialize(data, Tweet) for data in serialized_list
+                ],
+                number=repeat,
+            )
+            self.stdout.write(
+                "{:>8}: {:>8} bytes, {:>8.3f} ms per list".format(
+                    name, total_bytes, seconds * 1000 / repeat
+                )
+            )
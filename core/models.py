@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class CountDeltasFlush(models.Model):
+    # the id of the last flush of the write-behind count deltas, written in
+    # the same transaction as the deltas, so that a flush which crashed after
+    # its commit is not applied again
+    flush_id = models.CharField(max_length=32, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.created_at} count deltas flush {self.flush_id}"
@@ -0,0 +1,14 @@
+from celery import shared_task
+from django.conf import settings
+
+from utils.redis_helper import RedisHelper
+
+
+# killed before the flush lock expires, so that two flushes never overlap
+@shared_task(
+    routing_key="default",
+    time_limit=settings.COUNT_DELTAS_FLUSH_LOCK_EXPIRE_TIME,
+)
+def flush_count_deltas_task():
+    flushed_count = RedisHelper.flush_count_deltas()
+    return f"{flushed_count} counters flushed."
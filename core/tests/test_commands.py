@@ -1,3 +1,4 @@
+from io import StringIO
 from unittest.mock import patch
 
 from django.core.management import call_command
@@ -20,3 +21,10 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command("wait_for_db")
             self.assertEqual(gi.call_count, 6)
+
+    def test_benchmark_redis_serializers(self):
+        """Test the benchmark reports every serializer"""
+        out = StringIO()
+        call_command("benchmark_redis_serializers", size=5, repeat=2, stdout=out)
+        self.assertIn("django:", out.getvalue())
+        self.assertIn("compact:", out.getvalue())
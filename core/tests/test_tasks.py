@@ -0,0 +1,104 @@
+from unittest.mock import Mock, patch
+
+from django.test import override_settings
+
+from core.tasks import flush_count_deltas_task
+from testing.testcases import TestCase
+from twitter.cache import (
+    COUNT_DELTAS_FLUSH_LOCK_KEY,
+    COUNT_DELTAS_FLUSHING_KEY,
+    COUNT_DELTAS_KEY,
+)
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
+
+
+@override_settings(COUNTERS_WRITE_BEHIND=True)
+class FlushCountDeltasTaskTests(TestCase):
+    def setUp(self):
+        self.clear_cache()
+        self.user1 = self.create_user("user1", "user1@example.com")
+        self.user2 = self.create_user("user2", "user2@example.com")
+        self.tweet = self.create_tweet(self.user1)
+
+    def test_flush_count_deltas_task(self):
+        self.create_like(self.user1, self.tweet)
+        like = self.create_like(self.user2, self.tweet)
+        self.create_comment(self.user2, self.tweet)
+
+        # only the redis counters are changed before the flush
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 0)
+        self.assertEqual(RedisHelper.get_count(self.tweet, "likes_count"), 2)
+        self.assertEqual(RedisHelper.get_count(self.tweet, "comments_count"), 1)
+
+        # a missed counter adds the deltas which are not flushed
+        RedisClient.get_connection().delete(
+            RedisHelper.get_count_key(self.tweet, "likes_count")
+        )
+        like.delete()
+        self.assertEqual(RedisHelper.get_count(self.tweet, "likes_count"), 1)
+
+        self.assertEqual(flush_count_deltas_task(), "2 counters flushed.")
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+        self.assertEqual(self.tweet.comments_count, 1)
+        self.assertEqual(flush_count_deltas_task(), "0 counters flushed.")
+
+    def test_flush_count_deltas_after_crash(self):
+        self.create_like(self.user1, self.tweet)
+        # the deltas moved aside by a crashed flush are applied first
+        conn = RedisClient.get_connection()
+        conn.rename(COUNT_DELTAS_KEY, COUNT_DELTAS_FLUSHING_KEY)
+        self.create_comment(self.user2, self.tweet)
+
+        self.assertEqual(flush_count_deltas_task(), "1 counters flushed.")
+        self.assertEqual(flush_count_deltas_task(), "1 counters flushed.")
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+        self.assertEqual(self.tweet.comments_count, 1)
+
+    def test_flush_count_deltas_after_crash_after_commit(self):
+        self.create_like(self.user1, self.tweet)
+        # the flush crashes after its commit, before dropping the deltas
+        conn = RedisClient.get_connection()
+        with patch.object(RedisClient, "get_connection") as get_connection:
+            get_connection.return_value = Mock(wraps=conn)
+            get_connection.return_value.delete.side_effect = SystemExit
+            with self.assertRaises(SystemExit):
+                RedisHelper.flush_count_deltas()
+        self.assertTrue(conn.exists(COUNT_DELTAS_FLUSHING_KEY))
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+
+        # the committed deltas are not applied again
+        conn.delete(COUNT_DELTAS_FLUSH_LOCK_KEY)
+        self.assertEqual(flush_count_deltas_task(), "0 counters flushed.")
+        self.assertFalse(conn.exists(COUNT_DELTAS_FLUSHING_KEY))
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+
+    def test_reload_counter_while_dropping_flushed_deltas(self):
+        self.create_like(self.user1, self.tweet)
+        key = RedisHelper.get_count_key(self.tweet, "likes_count")
+        version_key = RedisHelper.get_count_version_key(key)
+        conn = RedisClient.get_connection()
+        drop_flushing_deltas = RedisHelper._drop_flushing_deltas
+        reloaded_counts = []
+
+        def reload_and_drop(deltas):
+            # the counter is reloaded after the commit, before the drop
+            conn.delete(key)
+            reloaded_counts.append(RedisHelper.get_count(self.tweet, "likes_count"))
+            drop_flushing_deltas(deltas)
+
+        version = int(conn.get(version_key) or 0)
+        with patch.object(
+            RedisHelper, "_drop_flushing_deltas", side_effect=reload_and_drop
+        ):
+            self.assertEqual(flush_count_deltas_task(), "1 counters flushed.")
+        # the committed deltas are not added to the db count again
+        self.assertEqual(reloaded_counts, [1])
+        self.assertEqual(int(conn.get(key)), 1)
+        # the loads which started before the drop are not cached
+        self.assertEqual(int(conn.get(version_key)), version + 1)
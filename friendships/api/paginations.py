@@ -1,14 +1,48 @@
+from functools import partial
+
+from django.core.paginator import Paginator
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from utils.paginations import EndlessPagination
+
+
+class PresetCountPaginator(Paginator):
+    # the count is given by the cached counters instead of COUNT(*)
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
 
 class FriendshipPagination(PageNumberPagination):
     # https://..../api/freindship/1/followers/?page=5&size=10
+    # https://..../api/freindship/1/followers/?cursor= (cursor mode, no count)
     page_size = 20
     page_size_query_param = "size"
     max_page_size = 20
 
+    def __init__(self):
+        super().__init__()
+        self.count = None
+        self.endless_pagination = None
+
+    @property
+    def django_paginator_class(self):
+        return partial(PresetCountPaginator, count=self.count)
+
+    def paginate_queryset(self, queryset, request, view=None, get_count=None):
+        if "cursor" in request.query_params:
+            self.endless_pagination = EndlessPagination()
+            self.endless_pagination.page_size = self.page_size
+            return self.endless_pagination.paginate_queryset(queryset, request, view)
+        if get_count is not None:
+            self.count = get_count()
+        return super().paginate_queryset(queryset, request, view)
+
     def get_paginated_response(self, data):
+        if self.endless_pagination is not None:
+            return self.endless_pagination.get_paginated_response(data)
         return Response(
             {
                 "total_results": self.page.paginator.count,
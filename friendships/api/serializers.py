@@ -5,20 +5,34 @@ from rest_framework.exceptions import ValidationError
 from accounts.api.serializers import UserSerializerForFriendship
 from friendships.models import Friendship
 from friendships.services import FriendshipService
+from utils.memcached_helper import MemcachedHelper
+from utils.serializers import PrimedListSerializer
 
 
 class FollowingUserIdSetMixin:
-    @property
-    def following_user_id_set(self: serializers.ModelSerializer):
+    def prime_has_followed(self: serializers.ModelSerializer, user_ids):
+        # check the users of the whole page with one SMISMEMBER and keep the
+        # result in the context
         if self.context["request"].user.is_anonymous:
-            return {}
-        if hasattr(self, "_cached_following_user_id_set"):
-            return self._cached_following_user_id_set
-        user_id_set = FriendshipService.get_following_user_id_set(
-            self.context["request"].user.id,
+            return
+        has_followed_map = self.context.setdefault("has_followed_map", {})
+        has_followed_map.update(
+            FriendshipService.get_has_followed_map(
+                self.context["request"].user.id,
+                user_ids,
+            )
         )
-        setattr(self, "_cached_following_user_id_set", user_id_set)
-        return user_id_set
+
+    def has_followed(self: serializers.ModelSerializer, user_id):
+        if self.context["request"].user.is_anonymous:
+            return False
+        has_followed_map = self.context.get("has_followed_map", {})
+        if user_id in has_followed_map:
+            return has_followed_map[user_id]
+        return FriendshipService.get_has_followed_map(
+            self.context["request"].user.id,
+            [user_id],
+        )[user_id]
 
 
 class FollowerSerializer(serializers.ModelSerializer, FollowingUserIdSetMixin):
@@ -28,10 +42,20 @@ class FollowerSerializer(serializers.ModelSerializer, FollowingUserIdSetMixin):
     class Meta:
         model = Friendship
         fields = ["user", "created_at", "has_followed"]
+        list_serializer_class = PrimedListSerializer
+
+    def prime(self, friendships):
+        MemcachedHelper.prime_cached_objects(
+            friendships, User, "from_user_id", "_cached_from_user"
+        )
+        self.fields["user"].prime(
+            [friendship.cached_from_user for friendship in friendships]
+        )
+        self.prime_has_followed([friendship.from_user_id for friendship in friendships])
 
     def get_has_followed(self, obj):
         # validate the user_id is in following set or not
-        return obj.from_user_id in self.following_user_id_set
+        return self.has_followed(obj.from_user_id)
 
 
 class FollowingSerializer(serializers.ModelSerializer, FollowingUserIdSetMixin):
@@ -42,10 +66,20 @@ class FollowingSerializer(serializers.ModelSerializer, FollowingUserIdSetMixin):
     class Meta:
         model = Friendship
         fields = ["user", "created_at", "has_followed"]
+        list_serializer_class = PrimedListSerializer
+
+    def prime(self, friendships):
+        MemcachedHelper.prime_cached_objects(
+            friendships, User, "to_user_id", "_cached_to_user"
+        )
+        self.fields["user"].prime(
+            [friendship.cached_to_user for friendship in friendships]
+        )
+        self.prime_has_followed([friendship.to_user_id for friendship in friendships])
 
     def get_has_followed(self, obj):
         # validate the user_id is in following set or not
-        return obj.to_user_id in self.following_user_id_set
+        return self.has_followed(obj.to_user_id)
 
 
 class FriendshipSerializerForCreate(serializers.ModelSerializer):
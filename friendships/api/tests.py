@@ -224,3 +224,15 @@ class FriendshipApiTests(TestCase):
         self.assertEqual(response.data["total_results"], page_size * 2)
         self.assertEqual(response.data["page_number"], 1)
         self.assertEqual(response.data["has_next_page"], True)
+
+        # cursor mode does not count the friendships
+        response = self.anonymous_client.get(url, {"cursor": ""})
+        self.assertEqual(len(response.data["results"]), page_size)
+        self.assertNotIn("total_results", response.data)
+        self.assertEqual(response.data["has_next_page"], True)
+        response = self.anonymous_client.get(
+            url, {"cursor": response.data["next_cursor"]}
+        )
+        self.assertEqual(len(response.data["results"]), page_size)
+        self.assertEqual(response.data["has_next_page"], False)
+        self.assertEqual(response.data["next_cursor"], None)
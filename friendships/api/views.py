@@ -11,6 +11,8 @@ from friendships.api.serializers import (
     FriendshipSerializerForCreate,
 )
 from friendships.models import Friendship
+from friendships.services import FriendshipService
+from newsfeeds.services import NewsFeedServices
 
 
 class FriendshipViewSet(viewsets.GenericViewSet):
@@ -23,7 +25,13 @@ class FriendshipViewSet(viewsets.GenericViewSet):
     def followers(self, request, pk):
         # GET /api/friendship/1/followers
         friendships = Friendship.objects.filter(to_user_id=pk).order_by("-created_at")
-        page = self.paginate_queryset(friendships)
+        # the total comes from the cached follower set, not COUNT(*)
+        page = self.paginator.paginate_queryset(
+            friendships,
+            request,
+            view=self,
+            get_count=lambda: FriendshipService.get_follower_count(pk),
+        )
         serializer = FollowerSerializer(page, many=True, context={"request": request})
         return self.get_paginated_response(serializer.data)
 
@@ -33,7 +41,12 @@ class FriendshipViewSet(viewsets.GenericViewSet):
     @action(methods=["GET"], detail=True, permission_classes=[AllowAny])
     def followings(self, request, pk):
         friendships = Friendship.objects.filter(from_user_id=pk).order_by("-created_at")
-        page = self.paginate_queryset(friendships)
+        page = self.paginator.paginate_queryset(
+            friendships,
+            request,
+            view=self,
+            get_count=lambda: FriendshipService.get_following_count(pk),
+        )
         serializer = FollowingSerializer(page, many=True, context={"request": request})
         return self.get_paginated_response(serializer.data)
 
@@ -68,6 +81,8 @@ class FriendshipViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         instance = serializer.save()
+        # merge the recent tweets of the followee into the newsfeeds
+        NewsFeedServices.backfill_newsfeeds(request.user.id, instance.to_user_id)
         return Response(
             FollowingSerializer(instance, context={"request": request}).data,
             status=status.HTTP_201_CREATED,
@@ -98,4 +113,6 @@ class FriendshipViewSet(viewsets.GenericViewSet):
             from_user=request.user,
             to_user=pk,
         ).delete()
+        if deleted:
+            NewsFeedServices.retract_newsfeeds(request.user.id, unfollow_user.id)
         return Response({"success": True, "deleted": deleted})
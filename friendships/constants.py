@@ -0,0 +1,3 @@
+# number of the follower or following ids fetched from db in one round trip
+# when streaming
+FRIENDSHIP_IDS_CHUNK_SIZE = 2000
@@ -1,5 +1,13 @@
-def invalidate_followings_cache(sender, instance, **kwargs):
+def add_to_friendship_cache(sender, instance, created, **kwargs):
     # Cannot import at the first line of file, because it will cause the loop error
     from friendships.services import FriendshipService
 
-    FriendshipService.invalidate_following_cache(instance.from_user_id)
+    if not created:
+        return
+    FriendshipService.add_to_cache(instance.from_user_id, instance.to_user_id)
+
+
+def remove_from_friendship_cache(sender, instance, **kwargs):
+    from friendships.services import FriendshipService
+
+    FriendshipService.remove_from_cache(instance.from_user_id, instance.to_user_id)
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.3 on 2026-10-18 09:07
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("friendships", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name="friendship",
+            index_together={
+                ("from_user_id", "created_at"),
+                ("to_user_id", "from_user_id"),
+                ("to_user_id", "created_at"),
+            },
+        ),
+    ]
@@ -1,8 +1,8 @@
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_delete, post_save
 
-from friendships.listeners import invalidate_followings_cache
+from friendships.listeners import add_to_friendship_cache, remove_from_friendship_cache
 from utils.memcached_helper import MemcachedHelper
 
 
@@ -29,6 +29,8 @@ class Friendship(models.Model):
             ("from_user_id", "created_at"),
             # according to the timeline, get the users that followd me
             ("to_user_id", "created_at"),
+            # range scan the followers by id when fanning out the tweets
+            ("to_user_id", "from_user_id"),
         )
         unique_together = (("from_user_id", "to_user_id"),)
 
@@ -37,13 +39,17 @@ class Friendship(models.Model):
 
     @property
     def cached_from_user(self):
+        if hasattr(self, "_cached_from_user"):
+            return self._cached_from_user
         return MemcachedHelper.get_object_through_cache(User, self.from_user_id)
 
     @property
     def cached_to_user(self):
+        if hasattr(self, "_cached_to_user"):
+            return self._cached_to_user
         return MemcachedHelper.get_object_through_cache(User, self.to_user_id)
 
 
-# Hook up with listeners to invalidate cache
-pre_delete.connect(invalidate_followings_cache, sender=Friendship)
-post_save.connect(invalidate_followings_cache, sender=Friendship)
+# Hook up with listeners to change the cached id sets
+post_save.connect(add_to_friendship_cache, sender=Friendship)
+post_delete.connect(remove_from_friendship_cache, sender=Friendship)
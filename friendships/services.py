@@ -1,10 +1,12 @@
-from django.conf import settings
-from django.core.cache import caches
-
+from friendships.constants import FRIENDSHIP_IDS_CHUNK_SIZE
 from friendships.models import Friendship
-from twitter.cache import FOLLOWINGS_PATTERN
-
-cache = caches["testing"] if settings.TESTING_MODE else caches["default"]
+from twitter.cache import (
+    FOLLOWERS_COUNT_PATTERN,
+    FOLLOWERS_SET_PATTERN,
+    FOLLOWINGS_COUNT_PATTERN,
+    FOLLOWINGS_SET_PATTERN,
+)
+from utils.redis_helper import RedisHelper
 
 
 # userA following list, the loggedin user can see the following list
@@ -20,27 +22,143 @@ class FriendshipService:
 
     @classmethod
     def get_follower_ids(cls, user_id):
-        friendships = Friendship.objects.filter(
-            to_user_id=user_id,
+        return list(cls.iter_follower_ids(user_id))
+
+    @classmethod
+    def _iter_ids(cls, queryset, id_field):
+        # stream the flat ids of the queryset in order, chunk by chunk with a
+        # keyset query after the last id, since iterator() still buffers the
+        # whole result set on mysqlclient
+        last_id = None
+        while True:
+            chunk = queryset
+            if last_id is not None:
+                chunk = chunk.filter(**{f"{id_field}__gt": last_id})
+            ids = list(chunk.order_by(id_field)[:FRIENDSHIP_IDS_CHUNK_SIZE])
+            yield from ids
+            if len(ids) < FRIENDSHIP_IDS_CHUNK_SIZE:
+                return
+            last_id = ids[-1]
+
+    @classmethod
+    def iter_follower_ids(cls, user_id, min_follower_id=None, max_follower_id=None):
+        # stream the follower ids in order from the (to_user_id, from_user_id)
+        # index, without loading the Friendship instances into memory
+        friendships = cls._follower_ids_queryset(user_id)
+        if min_follower_id is not None:
+            friendships = friendships.filter(from_user_id__gte=min_follower_id)
+        if max_follower_id is not None:
+            friendships = friendships.filter(from_user_id__lte=max_follower_id)
+        return cls._iter_ids(friendships, "from_user_id")
+
+    @classmethod
+    def iter_following_ids(cls, user_id):
+        return cls._iter_ids(cls._following_ids_queryset(user_id), "to_user_id")
+
+    @classmethod
+    def iter_follower_id_ranges(cls, user_id, batch_size):
+        # yield (min_follower_id, max_follower_id, size) of every batch_size
+        # followers, the memory does not grow with the number of followers
+        min_follower_id, max_follower_id, size = None, None, 0
+        for follower_id in cls.iter_follower_ids(user_id):
+            if size == batch_size:
+                yield min_follower_id, max_follower_id, size
+                min_follower_id, size = None, 0
+            if min_follower_id is None:
+                min_follower_id = follower_id
+            max_follower_id = follower_id
+            size += 1
+        if size:
+            yield min_follower_id, max_follower_id, size
+
+    @classmethod
+    def get_follower_count(cls, user_id):
+        # the counters are changed by the friendship listeners
+        key = FOLLOWERS_COUNT_PATTERN.format(user_id=user_id)
+        return RedisHelper.get_cached_count(
+            key, lambda: cls._follower_ids_queryset(user_id).count()
         )
-        return [friendship.from_user_id for friendship in friendships]
+
+    @classmethod
+    def get_following_count(cls, user_id):
+        key = FOLLOWINGS_COUNT_PATTERN.format(user_id=user_id)
+        return RedisHelper.get_cached_count(
+            key, lambda: cls._following_ids_queryset(user_id).count()
+        )
+
+    @classmethod
+    def _following_ids_queryset(cls, from_user_id):
+        return Friendship.objects.filter(
+            from_user_id=from_user_id,
+            to_user_id__isnull=False,
+        ).values_list("to_user_id", flat=True)
+
+    @classmethod
+    def _follower_ids_queryset(cls, to_user_id):
+        return Friendship.objects.filter(
+            to_user_id=to_user_id,
+            from_user_id__isnull=False,
+        ).values_list("from_user_id", flat=True)
 
     @classmethod
     def get_following_user_id_set(cls, from_user_id):
-        # fetch the cache
-        # LRU will be used by release the memory
-        key = FOLLOWINGS_PATTERN.format(user_id=from_user_id)
-        user_id_set = cache.get(key)
-        if user_id_set is not None:
-            return user_id_set
-
-        # If the data was not stored in cache, we can search from the DB, maybe litte slow.
-        friendships = Friendship.objects.filter(from_user_id=from_user_id)
-        user_id_set = {fs.to_user_id for fs in friendships}
-        cache.set(key, user_id_set)
-        return user_id_set
-
-    @classmethod
-    def invalidate_following_cache(cls, from_user_id):
-        key = FOLLOWINGS_PATTERN.format(user_id=from_user_id)
-        cache.delete(key)
+        # the redis set is changed by the friendship listeners, it is loaded
+        # from db only when it is not cached
+        key = FOLLOWINGS_SET_PATTERN.format(user_id=from_user_id)
+        return RedisHelper.get_id_set(key, lambda: cls.iter_following_ids(from_user_id))
+
+    @classmethod
+    def get_follower_user_id_set(cls, to_user_id):
+        # the redis set is changed by the friendship listeners like the one of
+        # the followings, the fanout still streams the follower id ranges from
+        # db, a big set is not read in one SMEMBERS
+        key = FOLLOWERS_SET_PATTERN.format(user_id=to_user_id)
+        return RedisHelper.get_id_set(key, lambda: cls.iter_follower_ids(to_user_id))
+
+    @classmethod
+    def get_has_followed_map(cls, from_user_id, to_user_ids):
+        # check which of to_user_ids the user has followed, return {id: bool}
+        key = FOLLOWINGS_SET_PATTERN.format(user_id=from_user_id)
+        return RedisHelper.get_id_set_membership(
+            key,
+            lambda: cls.iter_following_ids(from_user_id),
+            to_user_ids,
+            lambda user_ids: set(
+                cls._following_ids_queryset(from_user_id).filter(
+                    to_user_id__in=user_ids
+                )
+            ),
+        )
+
+    @classmethod
+    def has_followed(cls, from_user_id, to_user_id):
+        return cls.get_has_followed_map(from_user_id, [to_user_id])[to_user_id]
+
+    @classmethod
+    def add_to_cache(cls, from_user_id, to_user_id):
+        RedisHelper.add_to_id_set(
+            FOLLOWINGS_SET_PATTERN.format(user_id=from_user_id), to_user_id
+        )
+        RedisHelper.add_to_id_set(
+            FOLLOWERS_SET_PATTERN.format(user_id=to_user_id), from_user_id
+        )
+        cls._change_cached_counts(from_user_id, to_user_id, 1)
+
+    @classmethod
+    def remove_from_cache(cls, from_user_id, to_user_id):
+        RedisHelper.remove_from_id_set(
+            FOLLOWINGS_SET_PATTERN.format(user_id=from_user_id), to_user_id
+        )
+        RedisHelper.remove_from_id_set(
+            FOLLOWERS_SET_PATTERN.format(user_id=to_user_id), from_user_id
+        )
+        cls._change_cached_counts(from_user_id, to_user_id, -1)
+
+    @classmethod
+    def _change_cached_counts(cls, from_user_id, to_user_id, delta):
+        RedisHelper.change_cached_counts(
+            [
+                (FOLLOWINGS_COUNT_PATTERN.format(user_id=from_user_id), delta),
+                (FOLLOWERS_COUNT_PATTERN.format(user_id=to_user_id), delta),
+            ]
+        )
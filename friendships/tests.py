@@ -1,6 +1,11 @@
+from unittest.mock import patch
+
 from friendships.models import Friendship
 from friendships.services import FriendshipService
 from testing.testcases import TestCase
+from twitter.cache import FOLLOWINGS_SET_PATTERN
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
 
 
 class FriendshipServiceTests(TestCase):
@@ -24,3 +29,111 @@ class FriendshipServiceTests(TestCase):
         Friendship.objects.filter(from_user=self.user1, to_user=self.user2).delete()
         user_id_set = FriendshipService.get_following_user_id_set(self.user1.id)
         self.assertSetEqual(user_id_set, {follow_user1.id, follow_user2.id})
+
+    def test_cached_id_sets(self):
+        user3 = self.create_user("user3_name", email="user3@example.com")
+        self.assertEqual(
+            FriendshipService.get_following_user_id_set(self.user1.id), set()
+        )
+        self.assertEqual(FriendshipService.get_follower_count(self.user2.id), 0)
+        self.assertEqual(FriendshipService.get_follower_count(user3.id), 0)
+        self.assertEqual(FriendshipService.get_following_count(self.user1.id), 0)
+        self.assertEqual(FriendshipService.get_follower_user_id_set(user3.id), set())
+
+        # the cached sets and counters are changed by the listeners, not loaded again
+        Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+        friendship = Friendship.objects.create(from_user=self.user1, to_user=user3)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                FriendshipService.get_following_user_id_set(self.user1.id),
+                {self.user2.id, user3.id},
+            )
+            self.assertEqual(FriendshipService.get_follower_count(self.user2.id), 1)
+            self.assertEqual(
+                FriendshipService.get_has_followed_map(
+                    self.user1.id, [self.user2.id, self.user1.id]
+                ),
+                {self.user2.id: True, self.user1.id: False},
+            )
+            self.assertEqual(FriendshipService.get_follower_count(user3.id), 1)
+            self.assertEqual(FriendshipService.get_following_count(self.user1.id), 2)
+            self.assertEqual(
+                FriendshipService.get_follower_user_id_set(user3.id), {self.user1.id}
+            )
+
+        friendship.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(FriendshipService.get_following_count(self.user1.id), 1)
+            self.assertEqual(FriendshipService.get_follower_count(user3.id), 0)
+            self.assertEqual(
+                FriendshipService.get_follower_user_id_set(user3.id), set()
+            )
+
+    def test_cached_id_set_single_flight(self):
+        Friendship.objects.create(from_user=self.user1, to_user=self.user2)
+        key = FOLLOWINGS_SET_PATTERN.format(user_id=self.user1.id)
+        conn = RedisClient.get_connection()
+
+        # another request is filling the set, read db without filling it again
+        conn.set(RedisHelper.get_fill_lock_key(key), "token")
+        with patch.object(RedisHelper, "_wait_for_fill"):
+            self.assertEqual(
+                FriendshipService.get_following_user_id_set(self.user1.id),
+                {self.user2.id},
+            )
+            self.assertEqual(
+                FriendshipService.get_has_followed_map(
+                    self.user1.id, [self.user2.id, self.user1.id]
+                ),
+                {self.user2.id: True, self.user1.id: False},
+            )
+        self.assertFalse(conn.exists(key))
+
+        # a change while the set is not cached does not mark it dirty
+        conn.delete(RedisHelper.get_fill_lock_key(key))
+        Friendship.objects.create(from_user=self.user1, to_user=self.user1)
+        self.assertFalse(conn.exists(RedisHelper.get_fill_dirty_key(key)))
+        self.assertEqual(
+            FriendshipService.get_following_user_id_set(self.user1.id),
+            {self.user1.id, self.user2.id},
+        )
+        self.assertTrue(conn.exists(key))
+
+    def test_iter_follower_id_ranges(self):
+        followers = [
+            self.create_user(f"follower{i}", email=f"follower{i}@example.com")
+            for i in range(5)
+        ]
+        for follower in reversed(followers):
+            Friendship.objects.create(from_user=follower, to_user=self.user1)
+        Friendship.objects.create(from_user=self.user2, to_user=self.user2)
+        follower_ids = [follower.id for follower in followers]
+
+        self.assertEqual(
+            FriendshipService.get_follower_ids(self.user1.id), follower_ids
+        )
+        ranges = list(FriendshipService.iter_follower_id_ranges(self.user1.id, 2))
+        self.assertEqual(
+            ranges,
+            [
+                (follower_ids[0], follower_ids[1], 2),
+                (follower_ids[2], follower_ids[3], 2),
+                (follower_ids[4], follower_ids[4], 1),
+            ],
+        )
+        self.assertEqual(
+            list(
+                FriendshipService.iter_follower_ids(
+                    self.user1.id, follower_ids[2], follower_ids[3]
+                )
+            ),
+            follower_ids[2:4],
+        )
+
+        # the followers are read chunk by chunk, one query per chunk
+        with patch("friendships.services.FRIENDSHIP_IDS_CHUNK_SIZE", 2):
+            with self.assertNumQueries(3):
+                self.assertEqual(
+                    list(FriendshipService.iter_follower_ids(self.user1.id)),
+                    follower_ids,
+                )
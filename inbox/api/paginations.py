@@ -0,0 +1,7 @@
+from utils.paginations import EndlessPagination
+
+
+class NotificationPagination(EndlessPagination):
+    # https://..../api/notifications/?cursor=...&unread=true
+    # keyset of (timestamp, id), no OFFSET or COUNT(*) for the deep pages
+    ordering_field = "timestamp"
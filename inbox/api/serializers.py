@@ -1,8 +1,13 @@
 from notifications.models import Notification
 from rest_framework import serializers
 
+from inbox.services import NotificationService
+
 
 class NotificationSerializer(serializers.ModelSerializer):
+    actor_count = serializers.SerializerMethodField()
+    recent_actor_ids = serializers.SerializerMethodField()
+
     class Meta:
         model = Notification
         fields = (
@@ -16,8 +21,17 @@ class NotificationSerializer(serializers.ModelSerializer):
             "target_object_id",
             "timestamp",
             "unread",
+            "actor_count",
+            "recent_actor_ids",
         )
 
+    # the notifications which are not aggregated have one actor
+    def get_actor_count(self, obj):
+        return (obj.data or {}).get("actor_count", 1)
+
+    def get_recent_actor_ids(self, obj):
+        return (obj.data or {}).get("recent_actor_ids", [int(obj.actor_object_id)])
+
 
 class NotificationSerializerForUpdate(serializers.ModelSerializer):
     unread = serializers.BooleanField()
@@ -27,6 +41,12 @@ class NotificationSerializerForUpdate(serializers.ModelSerializer):
         fields = ("unread",)
 
     def update(self, instance, validated_data):
+        unread_changed = instance.unread != validated_data["unread"]
         instance.unread = validated_data["unread"]
         instance.save()
+        if unread_changed:
+            NotificationService.change_unread_count(
+                instance.recipient_id,
+                1 if instance.unread else -1,
+            )
         return instance
@@ -1,6 +1,8 @@
 from notifications.models import Notification
 
+from inbox.api.paginations import NotificationPagination
 from testing.testcases import TestCase
+from utils.time_helpers import utc_now
 
 COMMENT_URL = "/api/comments/"
 LIKE_URL = "/api/likes/"
@@ -42,6 +44,7 @@ class NotificationTests(TestCase):
 
 class NotificationApiTests(TestCase):
     def setUp(self):
+        self.clear_cache()
         self.user1, self.user1_client = self.create_user_and_client(
             "user1", "user1@sample.com"
         )
@@ -104,10 +107,16 @@ class NotificationApiTests(TestCase):
         response = self.user1_client.get(mark_url)
         self.assertEqual(response.status_code, 405)
         response = self.user1_client.post(mark_url)
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 202)
         self.assertEqual(response.data["marked_count"], 2)
         response = self.user1_client.get(unread_url)
         self.assertEqual(response.data["unread_count"], 0)
+        self.assertEqual(self.user1.notifications.filter(unread=True).count(), 0)
+
+        # nothing to mark
+        response = self.user1_client.post(mark_url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["marked_count"], 0)
 
     def test_list(self):
         self.user2_client.post(
@@ -134,23 +143,88 @@ class NotificationApiTests(TestCase):
         # user2 cannot see the notifications
         response = self.user2_client.get(NOTIFICATIONS_URL)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data["count"], 0)
+        self.assertEqual(len(response.data["results"]), 0)
 
         # user1 can see two notifications
         response = self.user1_client.get(NOTIFICATIONS_URL)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(len(response.data["results"]), 2)
 
         # mark one notification then you can just see one
         notification = self.user1.notifications.first()
         notification.unread = False
         notification.save()
         response = self.user1_client.get(NOTIFICATIONS_URL)
-        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(len(response.data["results"]), 2)
         response = self.user1_client.get(NOTIFICATIONS_URL, {"unread": True})
-        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(len(response.data["results"]), 1)
         response = self.user1_client.get(NOTIFICATIONS_URL, {"unread": False})
-        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_list_pagination(self):
+        page_size = NotificationPagination.page_size
+        # the notifications with the same timestamp are ordered by id
+        timestamp = utc_now()
+        notifications = [
+            Notification.objects.create(
+                recipient=self.user1,
+                actor=self.user2,
+                verb=f"notification {i}",
+                unread=i % 2 == 0,
+                timestamp=timestamp,
+            )
+            for i in range(page_size * 2 + 1)
+        ]
+        notifications = notifications[::-1]
+
+        response = self.user1_client.get(NOTIFICATIONS_URL)
+        self.assertEqual(
+            [notification["id"] for notification in response.data["results"]],
+            [notification.id for notification in notifications[:page_size]],
+        )
+        self.assertEqual(response.data["has_next_page"], True)
+        response = self.user1_client.get(
+            NOTIFICATIONS_URL, {"cursor": response.data["next_cursor"]}
+        )
+        self.assertEqual(
+            [notification["id"] for notification in response.data["results"]],
+            [notification.id for notification in notifications[page_size:-1]],
+        )
+        response = self.user1_client.get(
+            NOTIFICATIONS_URL, {"cursor": response.data["next_cursor"]}
+        )
+        self.assertEqual(response.data["results"][0]["id"], notifications[-1].id)
+        self.assertEqual(response.data["has_next_page"], False)
+        self.assertEqual(response.data["next_cursor"], None)
+
+        # the cursor works with the unread filter
+        unread_notifications = [
+            notification for notification in notifications if notification.unread
+        ]
+        response = self.user1_client.get(NOTIFICATIONS_URL, {"unread": True})
+        response = self.user1_client.get(
+            NOTIFICATIONS_URL,
+            {"unread": True, "cursor": response.data["next_cursor"]},
+        )
+        self.assertEqual(
+            [notification["id"] for notification in response.data["results"]],
+            [notification.id for notification in unread_notifications[page_size:]],
+        )
+        self.assertEqual(response.data["has_next_page"], False)
+
+        # the new notifications are loaded by timestamp__gt
+        new_notification = Notification.objects.create(
+            recipient=self.user1,
+            actor=self.user2,
+            verb="new notification",
+        )
+        response = self.user1_client.get(
+            NOTIFICATIONS_URL, {"timestamp__gt": timestamp.isoformat()}
+        )
+        self.assertEqual(
+            [notification["id"] for notification in response.data["results"]],
+            [new_notification.id],
+        )
 
     def test_update(self):
         self.user2_client.post(
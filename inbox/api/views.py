@@ -3,10 +3,12 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from inbox.api.paginations import NotificationPagination
 from inbox.api.serializers import (
     NotificationSerializer,
     NotificationSerializerForUpdate,
 )
+from inbox.services import NotificationService
 from utils.decorators import required_params
 
 
@@ -16,6 +18,7 @@ class NotificationViewSet(
 ):
     serializer_class = NotificationSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = NotificationPagination
     filterset_fields = ("unread",)
 
     def get_queryset(self):
@@ -24,14 +27,15 @@ class NotificationViewSet(
     # GET /api/notifications/unread-count/
     @action(methods=["GET"], detail=False, url_path="unread-count")
     def unread_count(self, request, *args, **kwargs):
-        count = self.get_queryset().filter(unread=True).count()
+        count = NotificationService.get_unread_count(request.user.id)
         return Response({"unread_count": count}, status=status.HTTP_200_OK)
 
     # POST /api/notifications/mark-all-as-read/
     @action(methods=["POST"], detail=False, url_path="mark-all-as-read")
     def mark_all_as_read(self, request, *args, **kwargs):
-        updated_count = self.get_queryset().update(unread=False)
-        return Response({"marked_count": updated_count}, status=status.HTTP_200_OK)
+        # marked by a background task, the count is the cached unread count
+        marked_count = NotificationService.mark_all_as_read(request.user.id)
+        return Response({"marked_count": marked_count}, status=status.HTTP_202_ACCEPTED)
 
     @required_params(method="POST", params=["unread"])
     def update(self, request, *args, **kwargs):
@@ -0,0 +1,7 @@
+# number of the pending notifications inserted with one bulk_create
+NOTIFICATION_BATCH_SIZE = 500
+# number of the notifications marked as read by one UPDATE
+MARK_AS_READ_BATCH_SIZE = 1000
+
+# number of the recent actors kept in an aggregated notification
+NOTIFICATION_RECENT_ACTORS_LIMIT = 3
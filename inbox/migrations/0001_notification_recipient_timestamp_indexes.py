@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+# the notifications of a recipient are paginated by (timestamp, id) desc,
+# with or without the unread filter
+NOTIFICATION_INDEXES = [
+    models.Index(
+        fields=["recipient", "unread", "timestamp"],
+        name="notif_recipient_unread_ts",
+    ),
+    models.Index(
+        fields=["recipient", "timestamp"],
+        name="notif_recipient_ts",
+    ),
+]
+
+
+def add_indexes(apps, schema_editor):
+    Notification = apps.get_model("notifications", "Notification")
+    for index in NOTIFICATION_INDEXES:
+        schema_editor.add_index(Notification, index)
+
+
+def remove_indexes(apps, schema_editor):
+    Notification = apps.get_model("notifications", "Notification")
+    for index in NOTIFICATION_INDEXES:
+        schema_editor.remove_index(Notification, index)
+
+
+class Migration(migrations.Migration):
+    # the Notification model belongs to django-notifications-hq, so the
+    # indexes are created here instead of in the model Meta
+    dependencies = [
+        ("notifications", "0008_index_together_recipient_unread"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_indexes, remove_indexes),
+    ]
@@ -1,38 +1,228 @@
+import json
+from collections import Counter
+from datetime import timedelta
+
+from dateutil import parser
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from notifications.signals import notify
+from notifications.models import Notification
 
 from comments.models import Comment
+from inbox.constants import NOTIFICATION_RECENT_ACTORS_LIMIT
+from inbox.tasks import deliver_notifications_task, mark_notifications_as_read_task
 from tweets.models import Tweet
+from twitter.cache import PENDING_NOTIFICATIONS_KEY, UNREAD_NOTIFICATIONS_COUNT_PATTERN
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
+from utils.time_helpers import utc_now
 
 
 class NotificationService:
     @classmethod
     def send_like_notification(cls, like):
-        target = like.content_object
-        if like.user == target.user:
-            return
         if like.content_type == ContentType.objects.get_for_model(Tweet):
-            notify.send(
-                like.user,
-                recipient=target.user,
-                verb="liked your tweet.",
-                target=target,
-            )
-        if like.content_type == ContentType.objects.get_for_model(Comment):
-            notify.send(
-                like.user,
-                recipient=target.user,
-                verb="liked your comment.",
-                target=target,
-            )
+            verb = "liked your tweet."
+        elif like.content_type == ContentType.objects.get_for_model(Comment):
+            verb = "liked your comment."
+        else:
+            return
+        cls.queue_notification(like.user_id, verb, like.content_type_id, like.object_id)
 
     @classmethod
     def send_comment_notification(cls, comment):
-        if comment.user == comment.tweet.user:
-            return
-        notify.send(
-            comment.user,
-            recipient=comment.tweet.user,
-            verb="Commented on your tweet.",
-            target=comment.tweet,
+        cls.queue_notification(
+            comment.user_id,
+            "Commented on your tweet.",
+            ContentType.objects.get_for_model(Tweet).id,
+            comment.tweet_id,
+        )
+
+    @classmethod
+    def queue_notification(cls, actor_id, verb, target_content_type_id, target_id):
+        # the notification is inserted by the worker, so that the likes and the
+        # comments do not wait for the inbox, the recipient is the author of
+        # the target, resolved by the worker as well
+        conn = RedisClient.get_connection()
+        conn.rpush(
+            PENDING_NOTIFICATIONS_KEY,
+            json.dumps(
+                {
+                    "actor_id": actor_id,
+                    "verb": verb,
+                    "target_content_type_id": target_content_type_id,
+                    "target_id": target_id,
+                    "timestamp": utc_now().isoformat(),
+                }
+            ),
+        )
+        deliver_notifications_task.delay()
+
+    @classmethod
+    def create_notifications(cls, pending_notifications):
+        # resolve the recipients with one query per target type, and insert
+        # the notifications with one bulk_create
+        target_ids_by_content_type_id = {}
+        for pending in pending_notifications:
+            target_ids_by_content_type_id.setdefault(
+                pending["target_content_type_id"], set()
+            ).add(pending["target_id"])
+        recipient_ids = {}
+        for content_type_id, target_ids in target_ids_by_content_type_id.items():
+            model_class = ContentType.objects.get_for_id(content_type_id).model_class()
+            for target_id, user_id in model_class.objects.filter(
+                id__in=target_ids
+            ).values_list("id", "user_id"):
+                recipient_ids[(content_type_id, target_id)] = user_id
+
+        user_content_type = ContentType.objects.get_for_model(User)
+        notifications = []
+        for pending in pending_notifications:
+            target_key = (pending["target_content_type_id"], pending["target_id"])
+            recipient_id = recipient_ids.get(target_key)
+            # the target is deleted, or the users act on their own content
+            if recipient_id is None or recipient_id == pending["actor_id"]:
+                continue
+            notifications.append(
+                Notification(
+                    recipient_id=recipient_id,
+                    actor_content_type=user_content_type,
+                    actor_object_id=pending["actor_id"],
+                    verb=pending["verb"],
+                    target_content_type_id=pending["target_content_type_id"],
+                    target_object_id=pending["target_id"],
+                    timestamp=parser.isoparse(pending["timestamp"]),
+                )
+            )
+        if settings.NOTIFICATION_AGGREGATION_WINDOW:
+            notifications = cls.aggregate_notifications(notifications)
+        else:
+            Notification.objects.bulk_create(notifications)
+        # only the inserted notifications are new unread ones
+        unread_deltas = Counter(
+            notification.recipient_id for notification in notifications
+        )
+        RedisHelper.change_cached_counts(
+            [
+                (UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id), delta)
+                for user_id, delta in unread_deltas.items()
+            ]
+        )
+        return notifications
+
+    @classmethod
+    def get_aggregation_key(cls, notification):
+        return (
+            notification.recipient_id,
+            notification.verb,
+            notification.target_content_type_id,
+            str(notification.target_object_id),
+        )
+
+    @classmethod
+    def merge_notification(cls, aggregated, notification):
+        # keep the distinct actors in data, the latest first, so that an actor
+        # acting again, e.g. commenting twice, is counted once. the count and
+        # a sample of the recent ones are kept for the readers, the actor and
+        # the timestamp of the row are the latest ones
+        data = aggregated.data or {"actor_ids": [int(aggregated.actor_object_id)]}
+        actor_id = int(notification.actor_object_id)
+        actor_ids = [actor_id] + [
+            other_actor_id
+            for other_actor_id in data["actor_ids"]
+            if other_actor_id != actor_id
+        ]
+        aggregated.data = {
+            "actor_ids": actor_ids,
+            "actor_count": len(actor_ids),
+            "recent_actor_ids": actor_ids[:NOTIFICATION_RECENT_ACTORS_LIMIT],
+        }
+        aggregated.actor_object_id = notification.actor_object_id
+        aggregated.timestamp = notification.timestamp
+
+    @classmethod
+    def aggregate_notifications(cls, notifications):
+        # group the notifications by (recipient, verb, target) into the unread
+        # row of the same group within the aggregation window, return the
+        # inserted rows. only the delivering worker holding the lock writes
+        groups = {}
+        for notification in notifications:
+            key = cls.get_aggregation_key(notification)
+            groups.setdefault(key, []).append(notification)
+        if not groups:
+            return []
+
+        cutoff = utc_now() - timedelta(seconds=settings.NOTIFICATION_AGGREGATION_WINDOW)
+        aggregated_notifications = {}
+        for notification in Notification.objects.filter(
+            recipient_id__in={key[0] for key in groups},
+            verb__in={key[1] for key in groups},
+            target_object_id__in={key[3] for key in groups},
+            unread=True,
+            timestamp__gte=cutoff,
+        ).order_by("timestamp"):
+            key = cls.get_aggregation_key(notification)
+            aggregated_notifications[key] = notification
+
+        created_notifications = []
+        for key, group in groups.items():
+            aggregated = aggregated_notifications.get(key)
+            if aggregated is not None:
+                for notification in group:
+                    cls.merge_notification(aggregated, notification)
+                # the row may be read by the user since it was fetched
+                if Notification.objects.filter(id=aggregated.id, unread=True).update(
+                    actor_object_id=aggregated.actor_object_id,
+                    timestamp=aggregated.timestamp,
+                    data=aggregated.data,
+                ):
+                    continue
+            # a new group, or its row is read, insert a new unread row
+            aggregated = group[0]
+            for notification in group[1:]:
+                cls.merge_notification(aggregated, notification)
+            created_notifications.append(aggregated)
+
+        Notification.objects.bulk_create(created_notifications)
+        return created_notifications
+
+    @classmethod
+    def get_unread_count(cls, user_id):
+        # polled by the clients, a single MGET when it is cached. the count
+        # loaded from db is not cached if the counter changed meanwhile
+        key = UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id)
+        return RedisHelper.get_cached_count(
+            key,
+            lambda: Notification.objects.filter(
+                recipient_id=user_id, unread=True
+            ).count(),
+        )
+
+    @classmethod
+    def change_unread_count(cls, user_id, delta):
+        key = UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id)
+        RedisHelper.change_cached_counts([(key, delta)])
+
+    @classmethod
+    def invalidate_unread_count(cls, user_id):
+        key = UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id)
+        RedisHelper.invalidate_cached_counts([key])
+
+    @classmethod
+    def mark_all_as_read(cls, user_id):
+        # the notifications are marked in chunks by the task, the request only
+        # reads the max unread id and zeroes the cached counter
+        max_notification_id = (
+            Notification.objects.filter(recipient_id=user_id, unread=True)
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
         )
+        if max_notification_id is None:
+            return 0
+        unread_count = cls.get_unread_count(user_id)
+        conn = RedisClient.get_connection()
+        key = UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=user_id)
+        conn.set(key, 0, ex=settings.REDIS_KEY_EXPIRE_TIME)
+        mark_notifications_as_read_task.delay(user_id, max_notification_id)
+        return unread_count
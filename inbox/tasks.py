@@ -0,0 +1,117 @@
+import json
+import uuid
+
+from celery import shared_task
+from django.conf import settings
+
+from inbox.constants import MARK_AS_READ_BATCH_SIZE, NOTIFICATION_BATCH_SIZE
+from twitter.cache import (
+    PENDING_NOTIFICATIONS_KEY,
+    PENDING_NOTIFICATIONS_LOCK_KEY,
+    PENDING_NOTIFICATIONS_PROCESSING_KEY,
+)
+from utils.redis_client import RedisClient
+from utils.redis_helper import RELEASE_LOCK_SCRIPT
+from utils.time_constants import ONE_HOUR
+
+# claim a batch for the lock holder and extend the lock, nil if the lock is
+# lost. the batch left in the processing list by a crashed holder is claimed
+# again first, otherwise the head of the pending list is moved into it
+CLAIM_NOTIFICATIONS_SCRIPT = """
+if redis.call("GET", KEYS[1]) ~= ARGV[1] then
+    return false
+end
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+local batch = redis.call("LRANGE", KEYS[3], 0, -1)
+if #batch > 0 then
+    return batch
+end
+batch = redis.call("LRANGE", KEYS[2], 0, ARGV[2] - 1)
+if #batch > 0 then
+    redis.call("RPUSH", KEYS[3], unpack(batch))
+    redis.call("LTRIM", KEYS[2], #batch, -1)
+end
+return batch
+"""
+
+# drop the inserted batch, only if the lock is still held by the same token
+ACK_NOTIFICATIONS_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[2])
+end
+return -1
+"""
+
+
+@shared_task(routing_key="notifications", time_limit=ONE_HOUR)
+def deliver_notifications_task():
+    from inbox.services import NotificationService
+
+    # every like and comment queues this task, and it is swept by celery beat.
+    # the first one that gets the lock inserts all the pending notifications
+    # batch by batch, the others find nothing left. the lock is checked again
+    # after it is released, a notification pushed meanwhile is not stranded
+    conn = RedisClient.get_connection()
+    claim = conn.register_script(CLAIM_NOTIFICATIONS_SCRIPT)
+    ack = conn.register_script(ACK_NOTIFICATIONS_SCRIPT)
+    lock_key = PENDING_NOTIFICATIONS_LOCK_KEY
+    processing_key = PENDING_NOTIFICATIONS_PROCESSING_KEY
+    expire_time = settings.PENDING_NOTIFICATIONS_LOCK_EXPIRE_TIME
+    created_count = 0
+    while conn.llen(PENDING_NOTIFICATIONS_KEY) or conn.llen(processing_key):
+        token = uuid.uuid4().hex
+        if not conn.set(lock_key, token, nx=True, ex=expire_time):
+            break
+        try:
+            while True:
+                serialized_list = claim(
+                    keys=[lock_key, PENDING_NOTIFICATIONS_KEY, processing_key],
+                    args=[token, NOTIFICATION_BATCH_SIZE, expire_time],
+                )
+                # nothing left, or the lock is lost
+                if not serialized_list:
+                    break
+                notifications = NotificationService.create_notifications(
+                    [json.loads(data) for data in serialized_list]
+                )
+                if ack(keys=[lock_key, processing_key], args=[token]) < 0:
+                    break
+                created_count += len(notifications)
+        finally:
+            script = conn.register_script(RELEASE_LOCK_SCRIPT)
+            script(keys=[lock_key], args=[token])
+
+    return f"{created_count} notifications created."
+
+
+@shared_task(routing_key="notifications", time_limit=ONE_HOUR)
+def mark_notifications_as_read_task(user_id, max_notification_id):
+    from notifications.models import Notification
+
+    from inbox.services import NotificationService
+
+    # walk down the ids of the unread notifications chunk by chunk, every
+    # UPDATE locks at most MARK_AS_READ_BATCH_SIZE rows by primary key. the
+    # notifications created after the request (id > max) are kept unread
+    marked_count = 0
+    while True:
+        notification_ids = list(
+            Notification.objects.filter(
+                recipient_id=user_id,
+                unread=True,
+                id__lte=max_notification_id,
+            )
+            .order_by("-id")
+            .values_list("id", flat=True)[:MARK_AS_READ_BATCH_SIZE]
+        )
+        if not notification_ids:
+            break
+        marked_count += Notification.objects.filter(
+            id__in=notification_ids,
+            unread=True,
+        ).update(unread=False)
+        max_notification_id = notification_ids[-1] - 1
+
+    # the counter was set optimistically, reload it from db
+    NotificationService.invalidate_unread_count(user_id)
+    return f"{marked_count} notifications marked as read."
@@ -1,7 +1,18 @@
+from unittest.mock import patch
+
 from notifications.models import Notification
 
 from inbox.services import NotificationService
+from inbox.tasks import deliver_notifications_task, mark_notifications_as_read_task
 from testing.testcases import TestCase
+from twitter.cache import (
+    PENDING_NOTIFICATIONS_KEY,
+    PENDING_NOTIFICATIONS_LOCK_KEY,
+    PENDING_NOTIFICATIONS_PROCESSING_KEY,
+    UNREAD_NOTIFICATIONS_COUNT_PATTERN,
+)
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
 
 
 # Create your tests here.
@@ -33,3 +44,184 @@ class NotificationServiceTests(TestCase):
         like = self.create_like(self.user2, self.user1_tweet)
         NotificationService.send_like_notification(like)
         self.assertEqual(Notification.objects.count(), 1)
+
+    def test_deliver_notifications_task(self):
+        comment = self.create_comment(self.user1, self.user1_tweet)
+        likes = [
+            self.create_like(self.user2, self.user1_tweet),
+            self.create_like(self.user1, self.user1_tweet),
+            self.create_like(self.user2, comment),
+        ]
+        with patch("inbox.services.deliver_notifications_task.delay") as delay:
+            for like in likes:
+                NotificationService.send_like_notification(like)
+            NotificationService.send_comment_notification(
+                self.create_comment(self.user2, self.user1_tweet)
+            )
+            self.assertEqual(delay.call_count, 4)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        # the pending notifications are inserted together
+        self.assertEqual(deliver_notifications_task(), "3 notifications created.")
+        self.assertEqual(
+            sorted(Notification.objects.values_list("verb", flat=True)),
+            ["Commented on your tweet.", "liked your comment.", "liked your tweet."],
+        )
+        self.assertEqual(deliver_notifications_task(), "0 notifications created.")
+
+    def test_deliver_notifications_task_recovery(self):
+        conn = RedisClient.get_connection()
+        with patch("inbox.services.deliver_notifications_task.delay"):
+            NotificationService.send_comment_notification(
+                self.create_comment(self.user2, self.user1_tweet)
+            )
+        # a worker crashed after it claimed a batch, the batch is inserted by
+        # the next lock holder, before the pending ones
+        conn.rpush(
+            PENDING_NOTIFICATIONS_PROCESSING_KEY,
+            conn.lpop(PENDING_NOTIFICATIONS_KEY),
+        )
+        with patch("inbox.services.deliver_notifications_task.delay"):
+            NotificationService.send_like_notification(
+                self.create_like(self.user2, self.user1_tweet)
+            )
+        self.assertEqual(deliver_notifications_task(), "2 notifications created.")
+        self.assertFalse(conn.exists(PENDING_NOTIFICATIONS_PROCESSING_KEY))
+
+        # a worker which lost the lock claims nothing, the holder does it
+        with patch("inbox.services.deliver_notifications_task.delay"):
+            NotificationService.send_like_notification(
+                self.create_like(self.user2, self.create_tweet(self.user1))
+            )
+        conn.set(PENDING_NOTIFICATIONS_LOCK_KEY, "another worker")
+        self.assertEqual(deliver_notifications_task(), "0 notifications created.")
+        self.assertEqual(conn.llen(PENDING_NOTIFICATIONS_KEY), 1)
+        conn.delete(PENDING_NOTIFICATIONS_LOCK_KEY)
+        self.assertEqual(deliver_notifications_task(), "1 notifications created.")
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_unread_count(self):
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 0)
+
+        # the cached counter is changed by the delivered notifications
+        like = self.create_like(self.user2, self.user1_tweet)
+        NotificationService.send_like_notification(like)
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationService.get_unread_count(self.user1.id), 1)
+
+        # rebuilt from db on a miss
+        Notification.objects.update(unread=False)
+        NotificationService.invalidate_unread_count(self.user1.id)
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 0)
+
+        # the counter invalidated while loading from db is not cached stale
+        key = UNREAD_NOTIFICATIONS_COUNT_PATTERN.format(user_id=self.user1.id)
+        conn = RedisClient.get_connection()
+        conn.delete(key)
+        Notification.objects.update(unread=True)
+
+        def load_count():
+            Notification.objects.update(unread=False)
+            NotificationService.invalidate_unread_count(self.user1.id)
+            return 1
+
+        self.assertEqual(RedisHelper.get_cached_count(key, load_count), 1)
+        self.assertFalse(conn.exists(key))
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 0)
+
+    def test_aggregate_notifications(self):
+        users = [
+            self.create_user(f"liker{index}", f"liker{index}@sample.com")
+            for index in range(5)
+        ]
+        for user in users:
+            like = self.create_like(user, self.user1_tweet)
+            NotificationService.send_like_notification(like)
+
+        # the likes of the same tweet are aggregated into one unread row
+        self.assertEqual(Notification.objects.count(), 1)
+        notification = Notification.objects.first()
+        self.assertEqual(notification.actor_object_id, str(users[-1].id))
+        self.assertEqual(notification.data["actor_count"], 5)
+        self.assertEqual(
+            notification.data["recent_actor_ids"],
+            [user.id for user in reversed(users)][:3],
+        )
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 1)
+
+        # a read notification is not aggregated into
+        Notification.objects.update(unread=False)
+        NotificationService.invalidate_unread_count(self.user1.id)
+        like = self.create_like(self.user2, self.user1_tweet)
+        NotificationService.send_like_notification(like)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 1)
+
+    def test_aggregate_notifications_distinct_actors(self):
+        users = [
+            self.create_user(f"commenter{index}", f"commenter{index}@sample.com")
+            for index in range(5)
+        ]
+        for user in users + [users[0], users[2]]:
+            NotificationService.send_comment_notification(
+                self.create_comment(user, self.user1_tweet)
+            )
+        # the actors commenting again after more than the recent ones are
+        # counted once
+        notification = Notification.objects.get()
+        self.assertEqual(notification.data["actor_count"], 5)
+        self.assertEqual(
+            notification.data["recent_actor_ids"],
+            [users[2].id, users[0].id, users[4].id],
+        )
+
+    def test_aggregate_notifications_read_meanwhile(self):
+        NotificationService.send_comment_notification(
+            self.create_comment(self.user2, self.user1_tweet)
+        )
+        merge_notification = NotificationService.merge_notification
+
+        def read_and_merge(aggregated, notification):
+            # the user reads the row after it is fetched by the worker
+            if aggregated.id is not None:
+                Notification.objects.filter(id=aggregated.id).update(unread=False)
+            merge_notification(aggregated, notification)
+
+        with patch.object(
+            NotificationService, "merge_notification", side_effect=read_and_merge
+        ):
+            NotificationService.send_comment_notification(
+                self.create_comment(
+                    self.create_user("user3", "user3@sample.com"), self.user1_tweet
+                )
+            )
+        # the read row is kept as it is, the new comment gets a new unread row
+        read, unread = Notification.objects.order_by("id")
+        self.assertFalse(read.unread)
+        self.assertIsNone(read.data)
+        self.assertTrue(unread.unread)
+        self.assertIsNone(unread.data)
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 1)
+
+    def test_mark_notifications_as_read_task(self):
+        notifications = [
+            Notification.objects.create(
+                recipient=self.user1,
+                actor=self.user2,
+                verb=f"notification {i}",
+            )
+            for i in range(5)
+        ]
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 5)
+
+        # marked in chunks, the notifications after the max id are kept unread
+        with patch("inbox.tasks.MARK_AS_READ_BATCH_SIZE", 2):
+            self.assertEqual(
+                mark_notifications_as_read_task(self.user1.id, notifications[3].id),
+                "4 notifications marked as read.",
+            )
+        self.assertEqual(
+            list(Notification.objects.filter(unread=True).values_list("id", flat=True)),
+            [notifications[4].id],
+        )
+        self.assertEqual(NotificationService.get_unread_count(self.user1.id), 1)
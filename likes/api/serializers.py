@@ -1,3 +1,4 @@
+from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -5,7 +6,29 @@ from rest_framework.exceptions import ValidationError
 from accounts.api.serializers import UserSerializerForLike
 from comments.models import Comment
 from likes.models import Like
+from likes.services import LikeService
 from tweets.models import Tweet
+from utils.memcached_helper import MemcachedHelper
+from utils.serializers import PrimedListSerializer
+
+
+class HasLikedMixin:
+    def prime_has_liked(self: serializers.ModelSerializer, targets):
+        # keep the has_liked of the whole page in the context, so that
+        # get_has_liked does not query for each row
+        has_liked_map = self.context.setdefault("has_liked_map", {})
+        target_has_liked = LikeService.get_has_liked_map(
+            self.context["request"].user,
+            targets,
+        )
+        for target in targets:
+            has_liked_map[(target.__class__, target.id)] = target_has_liked[target.id]
+
+    def get_has_liked(self: serializers.ModelSerializer, obj):
+        has_liked_map = self.context.get("has_liked_map", {})
+        if (obj.__class__, obj.id) in has_liked_map:
+            return has_liked_map[(obj.__class__, obj.id)]
+        return LikeService.has_liked(self.context["request"].user, obj)
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -14,6 +37,11 @@ class LikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
         fields = ("user", "created_at")
+        list_serializer_class = PrimedListSerializer
+
+    def prime(self, likes):
+        MemcachedHelper.prime_cached_objects(likes, User, "user_id", "_cached_user")
+        self.fields["user"].prime([like.cached_user for like in likes])
 
 
 class BaseLikeSerializerForCreateAndCancel(serializers.ModelSerializer):
@@ -1,6 +1,12 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
+from core.tasks import flush_count_deltas_task
 from testing.testcases import TestCase
+from utils.redis_client import RedisClient
+from utils.redis_helper import RedisHelper
 
 LIKE_BASE_URL = "/api/likes/"
 LIKE_CANCEL_URL = "/api/likes/cancel/"
@@ -188,18 +194,18 @@ class LikeApiTests(TestCase):
         anonymous_client = APIClient()
         response = anonymous_client.get(COMMENT_LIST_API, {"tweet_id": tweet.id})
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data["comments"][0]["has_liked"], False)
-        self.assertEqual(response.data["comments"][0]["likes_count"], 0)
+        self.assertEqual(response.data["results"][0]["has_liked"], False)
+        self.assertEqual(response.data["results"][0]["likes_count"], 0)
 
         # test comments list api
         response = self.user2_client.get(COMMENT_LIST_API, {"tweet_id": tweet.id})
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data["comments"][0]["has_liked"], False)
-        self.assertEqual(response.data["comments"][0]["likes_count"], 0)
+        self.assertEqual(response.data["results"][0]["has_liked"], False)
+        self.assertEqual(response.data["results"][0]["likes_count"], 0)
         self.create_like(self.user2, comment)
         response = self.user2_client.get(COMMENT_LIST_API, {"tweet_id": tweet.id})
-        self.assertEqual(response.data["comments"][0]["has_liked"], True)
-        self.assertEqual(response.data["comments"][0]["likes_count"], 1)
+        self.assertEqual(response.data["results"][0]["has_liked"], True)
+        self.assertEqual(response.data["results"][0]["likes_count"], 1)
 
         # test tweet detail api
         self.create_like(self.user1, comment)
@@ -297,3 +303,59 @@ class LikeApiTests(TestCase):
         response = self.user2_client.get(NEWSFEED_LIST_API)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data["results"][0]["tweet"]["likes_count"], 3)
+
+    @override_settings(COUNTERS_WRITE_BEHIND=True)
+    def test_likes_count_with_write_behind(self):
+        tweet = self.create_tweet(self.user1)
+        data = {"content_type": "tweet", "object_id": tweet.id}
+        tweet_url = TWEET_DETAIL_API.format(tweet.id)
+        self.user1_client.post(LIKE_BASE_URL, data)
+        self.user2_client.post(LIKE_BASE_URL, data)
+        self.user1_client.post(LIKE_CANCEL_URL, data)
+
+        # the api serves the redis counter, the db is updated by the flush
+        response = self.user2_client.get(tweet_url)
+        self.assertEqual(response.data["likes_count"], 1)
+        tweet.refresh_from_db()
+        self.assertEqual(tweet.likes_count, 0)
+
+        # a missed counter is loaded from db with the pending deltas
+        RedisClient.get_connection().delete(
+            RedisHelper.get_count_key(tweet, "likes_count")
+        )
+        response = self.user2_client.get(tweet_url)
+        self.assertEqual(response.data["likes_count"], 1)
+
+        self.assertEqual(flush_count_deltas_task(), "1 counters flushed.")
+        tweet.refresh_from_db()
+        self.assertEqual(tweet.likes_count, 1)
+        self.clear_cache()
+        response = self.user2_client.get(tweet_url)
+        self.assertEqual(response.data["likes_count"], 1)
+
+    def test_has_liked_queries_in_tweets_api(self):
+        def count_like_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.user2_client.get(
+                    TWEET_LIST_API, {"user_id": self.user1.id}
+                )
+            queries = [q["sql"] for q in context.captured_queries]
+            return response, len([sql for sql in queries if "likes_like" in sql])
+
+        tweets = [self.create_tweet(self.user1) for _ in range(2)]
+        self.create_like(self.user2, tweets[0])
+        response, like_queries = count_like_queries()
+        self.assertEqual(
+            [tweet["has_liked"] for tweet in response.data["results"]],
+            [False, True],
+        )
+
+        # the like queries do not grow with the page size
+        tweets += [self.create_tweet(self.user1) for _ in range(4)]
+        self.create_like(self.user2, tweets[-1])
+        response, more_like_queries = count_like_queries()
+        self.assertEqual(like_queries, more_like_queries)
+        self.assertEqual(
+            [tweet["has_liked"] for tweet in response.data["results"]],
+            [True, False, False, False, False, True],
+        )
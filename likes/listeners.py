@@ -1,17 +1,16 @@
+from django.conf import settings
+
 from utils.redis_helper import RedisHelper
 
 
 def increase_likes_count(sender, instance, created, **kwargs):
     from django.db.models import F
 
-    from tweets.models import Tweet
-
     if not created:
         return
 
+    # both tweet and comment have the denormalized likes_count
     model_class = instance.content_type.model_class()
-    if model_class != Tweet:
-        return
 
     # NOT Recommended
     # tweet =instance.content_object
@@ -20,8 +19,11 @@ def increase_likes_count(sender, instance, created, **kwargs):
     # reason: because it will not trigger the update_at field and is not the atomic operation
 
     # method 1
-    tweet = instance.content_object
-    Tweet.objects.filter(id=instance.object_id).update(likes_count=F("likes_count") + 1)
+    # in write-behind mode the db is updated by flush_count_deltas_task
+    if not settings.COUNTERS_WRITE_BEHIND:
+        model_class.objects.filter(id=instance.object_id).update(
+            likes_count=F("likes_count") + 1
+        )
     RedisHelper.increase_count(instance.content_object, "likes_count")
 
     # method 2
@@ -33,12 +35,9 @@ def increase_likes_count(sender, instance, created, **kwargs):
 def decrease_likes_count(sender, instance, **kwargs):
     from django.db.models import F
 
-    from tweets.models import Tweet
-
     model_class = instance.content_type.model_class()
-    if model_class != Tweet:
-        return
-
-    tweet = instance.content_object
-    Tweet.objects.filter(id=instance.object_id).update(likes_count=F("likes_count") - 1)
+    if not settings.COUNTERS_WRITE_BEHIND:
+        model_class.objects.filter(id=instance.object_id).update(
+            likes_count=F("likes_count") - 1
+        )
     RedisHelper.decrease_count(instance.content_object, "likes_count")
@@ -13,3 +13,17 @@ class LikeService:
             object_id=target.id,
             user=user,
         ).exists()
+
+    @classmethod
+    def get_has_liked_map(cls, user, targets):
+        # {target.id: has_liked} of the targets of the same model in one query
+        if user.is_anonymous or not targets:
+            return {target.id: False for target in targets}
+        liked_object_ids = set(
+            Like.objects.filter(
+                content_type=ContentType.objects.get_for_model(targets[0].__class__),
+                object_id__in=[target.id for target in targets],
+                user=user,
+            ).values_list("object_id", flat=True)
+        )
+        return {target.id: target.id in liked_object_ids for target in targets}
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import AnonymousUser
+
+from likes.services import LikeService
+from testing.testcases import TestCase
+
+
+class LikeServiceTests(TestCase):
+    def setUp(self):
+        self.clear_cache()
+        self.user1 = self.create_user("user1", "user1@example.com")
+        self.user2 = self.create_user("user2", "user2@example.com")
+
+    def test_get_has_liked_map(self):
+        tweets = [self.create_tweet(self.user1) for _ in range(3)]
+        comment = self.create_comment(self.user1, tweets[0])
+        self.create_like(self.user2, tweets[1])
+        self.create_like(self.user2, comment)
+
+        with self.assertNumQueries(1):
+            has_liked_map = LikeService.get_has_liked_map(self.user2, tweets)
+        self.assertEqual(
+            has_liked_map,
+            {tweets[0].id: False, tweets[1].id: True, tweets[2].id: False},
+        )
+
+        # the likes of other users and other models are not counted
+        has_liked_map = LikeService.get_has_liked_map(self.user1, tweets)
+        self.assertEqual(set(has_liked_map.values()), {False})
+        has_liked_map = LikeService.get_has_liked_map(self.user2, [comment])
+        self.assertEqual(has_liked_map, {comment.id: True})
+
+        with self.assertNumQueries(0):
+            has_liked_map = LikeService.get_has_liked_map(AnonymousUser(), tweets)
+        self.assertEqual(set(has_liked_map.values()), {False})
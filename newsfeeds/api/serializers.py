@@ -1,7 +1,9 @@
 from rest_framework import serializers
 
 from newsfeeds.models import NewsFeed
+from newsfeeds.services import NewsFeedServices
 from tweets.api.serializers import TweetSerializer
+from utils.serializers import PrimedListSerializer
 
 
 class NewsFeedSerializer(serializers.ModelSerializer):
@@ -10,3 +12,9 @@ class NewsFeedSerializer(serializers.ModelSerializer):
     class Meta:
         model = NewsFeed
         fields = ["id", "created_at", "tweet"]
+        list_serializer_class = PrimedListSerializer
+
+    def prime(self, newsfeeds):
+        NewsFeedServices.load_tweets(newsfeeds)
+        tweets = [newsfeed.cached_tweet() for newsfeed in newsfeeds]
+        self.fields["tweet"].prime([tweet for tweet in tweets if tweet is not None])
@@ -161,3 +161,62 @@ class NewsFeedApiTests(TestCase):
         # cache expired
         self.clear_cache()
         _test_newsfeeds_after_new_feed_pushed()
+
+    def test_pull_mode_tweets(self):
+        list_limit = settings.REDIS_LIST_LENGTH_LIMIT
+        pull_mode_user = self.create_user("pull_mode_user", "pull@example.com")
+        self.create_friendship(self.user1, self.user2)
+        self.create_friendship(self.user1, pull_mode_user)
+
+        # the tweet fanned out before the account is in pull mode
+        fanned_out_tweet = self.create_tweet(pull_mode_user, "fanned out")
+        self.create_newsfeed(self.user1, fanned_out_tweet)
+        tweets = []
+        for i in range(list_limit + 5):
+            tweets.append(self.create_tweet(self.user2, f"pushed{i}"))
+            self.create_newsfeed(self.user1, tweets[-1])
+            tweets.append(self.create_tweet(pull_mode_user, f"pulled{i}"))
+            if i == 0:
+                NewsFeedServices.mark_pull_mode_user(pull_mode_user.id, tweets[-1].id)
+        expected_tweet_ids = [tweet.id for tweet in tweets[::-1]]
+        expected_tweet_ids.append(fanned_out_tweet.id)
+
+        def paginate_by_cursor():
+            response = self.user1_client.get(NEWSFEEDS_URL)
+            results = response.data["results"]
+            while response.data["has_next_page"]:
+                response = self.user1_client.get(
+                    NEWSFEEDS_URL, {"cursor": response.data["next_cursor"]}
+                )
+                results.extend(response.data["results"])
+            return results
+
+        # merged from the cached lists, then from db beyond them
+        for _ in range(2):
+            results = paginate_by_cursor()
+            self.assertEqual(
+                [result["tweet"]["id"] for result in results],
+                expected_tweet_ids,
+            )
+            pulled_results = [result for result in results if result["id"] < 0]
+            self.assertEqual(len(pulled_results), list_limit + 5)
+            self.assertEqual(pulled_results[0]["id"], -pulled_results[0]["tweet"]["id"])
+            # the pull mode state is kept in db, it survives the cache
+            self.clear_cache()
+
+        # the users who do not follow the account cannot see its tweets
+        response = self.user2_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.data["results"], [])
+
+    def test_pull_mode_tweets_fanned_out(self):
+        pull_mode_user = self.create_user("pull_mode_user", "pull@example.com")
+        self.create_friendship(self.user1, pull_mode_user)
+        tweets = [self.create_tweet(pull_mode_user, f"tweet{i}") for i in range(2)]
+        NewsFeedServices.mark_pull_mode_user(pull_mode_user.id, tweets[0].id)
+        # a pulled tweet with a newsfeed as well is listed once
+        self.create_newsfeed(self.user1, tweets[1])
+        response = self.user1_client.get(NEWSFEEDS_URL)
+        self.assertEqual(
+            [result["tweet"]["id"] for result in response.data["results"]],
+            [tweets[1].id, tweets[0].id],
+        )
@@ -20,5 +20,8 @@ class NewsFeedViewSet(viewsets.GenericViewSet):
         if page is None:
             queryset = NewsFeed.objects.filter(user=request.user)
             page = self.paginate_queryset(queryset)
+        page = NewsFeedServices.merge_pulled_newsfeeds(
+            request.user.id, page, self.paginator, request
+        )
         serializer = NewsFeedSerializer(page, context={"request": request}, many=True)
         return self.get_paginated_response(serializer.data)
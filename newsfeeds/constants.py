@@ -1,3 +1,7 @@
 from django.conf import settings
 
 FANOUT_BATCH_SIZE = 1000 if not settings.TESTING_MODE else 3
+
+# accounts with more followers than this threshold are not fanned out (push),
+# their followers pull the tweets when they read their newsfeeds
+PULL_MODE_FOLLOWERS_THRESHOLD = 10000 if not settings.TESTING_MODE else 5
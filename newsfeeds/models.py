@@ -28,6 +28,9 @@ class NewsFeed(models.Model):
         return f"{self.created_at} inbox of {self.user}: {self.tweet}"
 
     def cached_tweet(self):
+        # the tweets of a page are loaded in bulk by NewsFeedSerializer.prime
+        if hasattr(self, "_cached_tweet"):
+            return self._cached_tweet
         return MemcachedHelper.get_object_through_cache(Tweet, self.tweet_id)
 
 
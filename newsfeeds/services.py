@@ -1,6 +1,24 @@
+from django.conf import settings
+from django.db.models import Q
+
+from accounts.models import UserProfile
+from accounts.services import UserService
+from friendships.services import FriendshipService
 from newsfeeds.models import NewsFeed
-from newsfeeds.tasks import fanout_newsfeeds_main_task
-from twitter.cache import USER_NEWSFEEDS_PATTERN
+from newsfeeds.tasks import (
+    backfill_newsfeeds_task,
+    fanout_newsfeeds_main_task,
+    retract_newsfeeds_task,
+)
+from tweets.models import Tweet
+from tweets.services import TweetService
+from twitter.cache import (
+    PULL_MODE_SINCE_TWEET_ID_PATTERN,
+    PULL_MODE_USERS_KEY,
+    USER_NEWSFEEDS_PATTERN,
+)
+from utils.memcached_helper import MemcachedHelper
+from utils.redis_client import RedisClient
 from utils.redis_helper import RedisHelper
 
 
@@ -9,18 +27,214 @@ class NewsFeedServices:
     def fanout_to_followers(cls, tweet):
         fanout_newsfeeds_main_task.delay(tweet.id, tweet.user_id)
 
+    @classmethod
+    def backfill_newsfeeds(cls, user_id, followee_id):
+        backfill_newsfeeds_task.delay(user_id, followee_id)
+
+    @classmethod
+    def retract_newsfeeds(cls, user_id, followee_id):
+        retract_newsfeeds_task.delay(user_id, followee_id)
+
     @classmethod
     def get_cached_newsfeeds(cls, user_id):
         # Queryset is lazy loading
-        queryset = NewsFeed.objects.filter(user_id=user_id).order_by("-created_at")
+        queryset = NewsFeed.objects.filter(user_id=user_id).order_by(
+            "-created_at", "-id"
+        )
         key = USER_NEWSFEEDS_PATTERN.format(user_id=user_id)
-        return RedisHelper.load_objects(key, queryset)
+        newsfeeds = RedisHelper.load_objects(key, queryset)
+        # the user is not stored in the cached newsfeeds, it is known from the key
+        for newsfeed in newsfeeds:
+            newsfeed.user_id = user_id
+        return newsfeeds
 
     @classmethod
     def push_newsfeed_to_cache(cls, newsfeed):
         # Queryset is lazy loading
         queryset = NewsFeed.objects.filter(user_id=newsfeed.user_id).order_by(
-            "-created_at"
+            "-created_at", "-id"
         )
         key = USER_NEWSFEEDS_PATTERN.format(user_id=newsfeed.user_id)
         RedisHelper.push_object(key, newsfeed, queryset)
+
+    @classmethod
+    def push_newsfeeds_to_cache(cls, newsfeeds):
+        RedisHelper.push_objects(
+            [
+                (USER_NEWSFEEDS_PATTERN.format(user_id=newsfeed.user_id), newsfeed)
+                for newsfeed in newsfeeds
+            ]
+        )
+
+    @classmethod
+    def invalidate_cached_newsfeeds(cls, user_id):
+        # reloaded from db in order when reading
+        key = USER_NEWSFEEDS_PATTERN.format(user_id=user_id)
+        RedisHelper.invalidate_objects(key)
+
+    @classmethod
+    def mark_pull_mode_user(cls, user_id, tweet_id):
+        # once an account is in pull mode, its tweets are never fanned out,
+        # so keep it there to not lose the tweets from its followers' newsfeeds.
+        # the tweets before tweet_id were fanned out, they are not pulled. the
+        # state is kept in db, redis only caches it
+        UserProfile.objects.get_or_create(user_id=user_id)
+        UserProfile.objects.filter(
+            user_id=user_id,
+            pull_mode_since_tweet_id__isnull=True,
+        ).update(pull_mode_since_tweet_id=tweet_id)
+        # update() does not trigger the listeners of the profile
+        UserService.invalidate_profile(user_id)
+        RedisHelper.add_to_id_set(PULL_MODE_USERS_KEY, user_id)
+
+    @classmethod
+    def _pull_mode_profiles(cls):
+        return UserProfile.objects.filter(pull_mode_since_tweet_id__isnull=False)
+
+    @classmethod
+    def get_pull_mode_user_map(cls, user_ids):
+        # {user_id: bool} with one SMISMEMBER, the set of the pull mode users
+        # is loaded from db on a miss
+        return RedisHelper.get_id_set_membership(
+            PULL_MODE_USERS_KEY,
+            lambda: cls._pull_mode_profiles()
+            .order_by("user_id")
+            .values_list("user_id", flat=True)
+            .iterator(),
+            user_ids,
+            lambda user_ids: set(
+                cls._pull_mode_profiles()
+                .filter(user_id__in=user_ids)
+                .values_list("user_id", flat=True)
+            ),
+        )
+
+    @classmethod
+    def is_pull_mode_user(cls, user_id):
+        return cls.get_pull_mode_user_map([user_id])[user_id]
+
+    @classmethod
+    def get_pull_mode_since_tweet_ids(cls, user_ids):
+        # {user_id: since_tweet_id} with one MGET, the misses are read from db.
+        # the value never changes once it is set, so it is cached as it is
+        conn = RedisClient.get_connection()
+        keys = [
+            PULL_MODE_SINCE_TWEET_ID_PATTERN.format(user_id=user_id)
+            for user_id in user_ids
+        ]
+        since_tweet_ids = {
+            user_id: int(since_tweet_id)
+            for user_id, since_tweet_id in zip(user_ids, conn.mget(keys))
+            if since_tweet_id is not None
+        }
+        missed_user_ids = set(user_ids) - since_tweet_ids.keys()
+        if not missed_user_ids:
+            return since_tweet_ids
+        missed_since_tweet_ids = dict(
+            cls._pull_mode_profiles()
+            .filter(user_id__in=missed_user_ids)
+            .values_list("user_id", "pull_mode_since_tweet_id")
+        )
+        pipeline = conn.pipeline(transaction=False)
+        for user_id, since_tweet_id in missed_since_tweet_ids.items():
+            pipeline.set(
+                PULL_MODE_SINCE_TWEET_ID_PATTERN.format(user_id=user_id),
+                since_tweet_id,
+                ex=settings.REDIS_KEY_EXPIRE_TIME,
+            )
+        pipeline.execute()
+        since_tweet_ids.update(missed_since_tweet_ids)
+        return since_tweet_ids
+
+    @classmethod
+    def get_pull_mode_followees(cls, user_id):
+        # {followee_id: since_tweet_id} of the pull mode accounts the user
+        # follows, the followings are checked with one SMISMEMBER
+        following_user_ids = list(FriendshipService.get_following_user_id_set(user_id))
+        if not following_user_ids:
+            return {}
+        followee_ids = [
+            following_user_id
+            for following_user_id, is_pull_mode in cls.get_pull_mode_user_map(
+                following_user_ids
+            ).items()
+            if is_pull_mode
+        ]
+        if not followee_ids:
+            return {}
+        return cls.get_pull_mode_since_tweet_ids(followee_ids)
+
+    @classmethod
+    def build_pulled_newsfeed(cls, user_id, tweet):
+        # the pulled newsfeeds have no rows, they are identified by the negative
+        # ids of their tweets, and ordered by (created_at, id) like the others
+        newsfeed = NewsFeed(
+            id=-tweet.id,
+            user_id=user_id,
+            tweet_id=tweet.id,
+            created_at=tweet.created_at,
+        )
+        newsfeed._cached_tweet = tweet
+        return newsfeed
+
+    @classmethod
+    def paginate_pulled_newsfeeds(
+        cls, user_id, followee_id, since_tweet_id, paginator, request
+    ):
+        # the page of the followee's tweets in the range of the request, from
+        # its cached tweets, or from db when the range is beyond them
+        tweets = TweetService.get_cached_tweets(followee_id)
+        newsfeeds = sorted(
+            [
+                cls.build_pulled_newsfeed(user_id, tweet)
+                for tweet in tweets
+                if tweet.id >= since_tweet_id
+            ],
+            key=lambda newsfeed: (newsfeed.created_at, newsfeed.id),
+            reverse=True,
+        )
+        page = paginator.paginate_cached_list(newsfeeds, request)
+        if page is not None:
+            return page
+
+        queryset = Tweet.objects.filter(user_id=followee_id, id__gte=since_tweet_id)
+        # the newsfeed id in the cursor is the negative tweet id
+        if request.query_params.get("cursor"):
+            created_at, newsfeed_id = paginator.decode_cursor(request)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at)
+                | Q(created_at=created_at, id__gt=-newsfeed_id)
+            )
+        elif "created_at__lt" in request.query_params:
+            queryset = queryset.filter(
+                created_at__lt=request.query_params["created_at__lt"]
+            )
+        tweets = queryset.order_by("-created_at", "id")[: paginator.page_size + 1]
+        newsfeeds = [cls.build_pulled_newsfeed(user_id, tweet) for tweet in tweets]
+        return paginator.paginate_ordered_list(newsfeeds, request)
+
+    @classmethod
+    def merge_pulled_newsfeeds(cls, user_id, page, paginator, request):
+        # the tweets of the pull mode followees are paginated by the same
+        # request, and merged into the page of the pushed newsfeeds, whether it
+        # is read from cache or db
+        pull_mode_followees = cls.get_pull_mode_followees(user_id)
+        if not pull_mode_followees:
+            return page
+        pages = [(list(page), paginator.has_next_page)]
+        for followee_id, since_tweet_id in pull_mode_followees.items():
+            pulled_paginator = paginator.__class__()
+            pulled_page = cls.paginate_pulled_newsfeeds(
+                user_id, followee_id, since_tweet_id, pulled_paginator, request
+            )
+            pages.append((pulled_page, pulled_paginator.has_next_page))
+        # a tweet is either fanned out or pulled, the dedupe is only a guard
+        return paginator.merge_pages(pages, request, unique_field="tweet_id")
+
+    @classmethod
+    def load_tweets(cls, newsfeeds):
+        # load the tweets of the newsfeeds with one memcached get_many,
+        # and one db query for the cache misses
+        MemcachedHelper.prime_cached_objects(
+            newsfeeds, Tweet, "tweet_id", "_cached_tweet"
+        )
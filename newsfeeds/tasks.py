@@ -1,41 +1,126 @@
 from celery import shared_task
+from django.conf import settings
 
 from friendships.services import FriendshipService
-from newsfeeds.constants import FANOUT_BATCH_SIZE
+from newsfeeds.constants import FANOUT_BATCH_SIZE, PULL_MODE_FOLLOWERS_THRESHOLD
 from newsfeeds.models import NewsFeed
 from utils.time_constants import ONE_HOUR
 
 
 @shared_task(routing_key="newsfeeds", time_limit=ONE_HOUR)
-def fanout_newsfeeds_batch_task(tweet_id, follower_ids):
+def fanout_newsfeeds_batch_task(
+    tweet_id, tweet_user_id, min_follower_id, max_follower_id
+):
     from newsfeeds.services import NewsFeedServices
 
+    # every batch streams its own range of the followers
+    follower_ids = list(
+        FriendshipService.iter_follower_ids(
+            tweet_user_id, min_follower_id, max_follower_id
+        )
+    )
     newsfeeds = [
         NewsFeed(user_id=follower_id, tweet_id=tweet_id) for follower_id in follower_ids
     ]
 
     # use bulk_create to change insert to one line
     NewsFeed.objects.bulk_create(newsfeeds)
+    # bulk_create does not set the ids on mysql, read the rows back for the cache
+    created_newsfeeds = NewsFeed.objects.filter(
+        user_id__in=follower_ids,
+        tweet_id=tweet_id,
+    )
     # since post_save signal func would not trigger the bulk create, need push into cache
-    for newsfeed in newsfeeds:
-        NewsFeedServices.push_newsfeed_to_cache(newsfeed)
+    NewsFeedServices.push_newsfeeds_to_cache(created_newsfeeds)
 
     return f"{len(newsfeeds)} newsfeeds created."
 
 
 @shared_task(routing_key="default", time_limit=ONE_HOUR)
 def fanout_newsfeeds_main_task(tweet_id, tweet_user_id):
+    from newsfeeds.services import NewsFeedServices
+
     NewsFeed.objects.create(user_id=tweet_user_id, tweet_id=tweet_id)
 
-    # Fanout the tweet to all followers' timeline
-    follower_ids = FriendshipService.get_follower_ids(tweet_user_id)
-    index = 0
-    while index < len(follower_ids):
-        batch_ids = follower_ids[index : index + FANOUT_BATCH_SIZE]
-        fanout_newsfeeds_batch_task.delay(tweet_id, batch_ids)
-        index += FANOUT_BATCH_SIZE
+    # the account stays in pull mode even if it has fewer followers now, its
+    # followers keep pulling its tweets
+    if NewsFeedServices.is_pull_mode_user(tweet_user_id):
+        return "The account is in pull mode, 0 batch created."
+
+    # The account has too many followers, so do not fanout the tweet,
+    # the followers pull it when they read their newsfeeds
+    follower_count = FriendshipService.get_follower_count(tweet_user_id)
+    if follower_count > PULL_MODE_FOLLOWERS_THRESHOLD:
+        NewsFeedServices.mark_pull_mode_user(tweet_user_id, tweet_id)
+        return f"{follower_count} followers will pull the tweet, 0 batch created."
+
+    # Fanout the tweet to all followers' timeline, only the bounds of the
+    # follower id ranges are passed to the batches
+    follower_count, batch_count = 0, 0
+    for (
+        min_follower_id,
+        max_follower_id,
+        size,
+    ) in FriendshipService.iter_follower_id_ranges(tweet_user_id, FANOUT_BATCH_SIZE):
+        fanout_newsfeeds_batch_task.delay(
+            tweet_id, tweet_user_id, min_follower_id, max_follower_id
+        )
+        follower_count += size
+        batch_count += 1
 
     return "{} newsfeeds going to be fanout, {} batch created.".format(
-        len(follower_ids),
-        (len(follower_ids) - 1) // FANOUT_BATCH_SIZE + 1,
+        follower_count,
+        batch_count,
+    )
+
+
+@shared_task(routing_key="newsfeeds", time_limit=ONE_HOUR)
+def backfill_newsfeeds_task(user_id, followee_id):
+    from newsfeeds.services import NewsFeedServices
+    from tweets.services import TweetService
+
+    # the tweets of the pull mode accounts are merged when reading
+    if NewsFeedServices.is_pull_mode_user(followee_id):
+        return "0 newsfeeds backfilled, the followee is in pull mode."
+    # unfollowed before the task runs
+    if not FriendshipService.has_followed(user_id, followee_id):
+        return "0 newsfeeds backfilled, the followee is unfollowed."
+
+    tweets = TweetService.get_cached_tweets(followee_id)
+    tweets = tweets[: settings.REDIS_LIST_LENGTH_LIMIT]
+    newsfeeds = [NewsFeed(user_id=user_id, tweet_id=tweet.id) for tweet in tweets]
+    NewsFeed.objects.bulk_create(newsfeeds, ignore_conflicts=True)
+
+    # created_at is set to now by auto_now_add, order the backfilled newsfeeds
+    # by the time of their tweets instead
+    created_at_by_tweet_id = {tweet.id: tweet.created_at for tweet in tweets}
+    created_newsfeeds = list(
+        NewsFeed.objects.filter(
+            user_id=user_id,
+            tweet_id__in=created_at_by_tweet_id.keys(),
+        )
     )
+    for newsfeed in created_newsfeeds:
+        newsfeed.created_at = created_at_by_tweet_id[newsfeed.tweet_id]
+    NewsFeed.objects.bulk_update(created_newsfeeds, ["created_at"])
+    # the backfilled newsfeeds are not at the head of the cached list
+    NewsFeedServices.invalidate_cached_newsfeeds(user_id)
+
+    return f"{len(created_newsfeeds)} newsfeeds backfilled."
+
+
+@shared_task(routing_key="newsfeeds", time_limit=ONE_HOUR)
+def retract_newsfeeds_task(user_id, followee_id):
+    from newsfeeds.services import NewsFeedServices
+
+    # followed again before the task runs
+    if FriendshipService.has_followed(user_id, followee_id):
+        return "0 newsfeeds retracted, the followee is followed again."
+
+    deleted, _ = NewsFeed.objects.filter(
+        user_id=user_id,
+        tweet__user_id=followee_id,
+    ).delete()
+    NewsFeedServices.invalidate_cached_newsfeeds(user_id)
+
+    return f"{deleted} newsfeeds retracted."
@@ -1,6 +1,12 @@
+from friendships.models import Friendship
+from newsfeeds.constants import PULL_MODE_FOLLOWERS_THRESHOLD
 from newsfeeds.models import NewsFeed
 from newsfeeds.services import NewsFeedServices
-from newsfeeds.tasks import fanout_newsfeeds_main_task
+from newsfeeds.tasks import (
+    backfill_newsfeeds_task,
+    fanout_newsfeeds_main_task,
+    retract_newsfeeds_task,
+)
 from testing.testcases import TestCase
 from twitter.cache import USER_NEWSFEEDS_PATTERN
 from utils.redis_client import RedisClient
@@ -49,6 +55,30 @@ class NewsFeedServiceTests(TestCase):
         feeds = NewsFeedServices.get_cached_newsfeeds(self.user1.id)
         self.assertEqual([f.id for f in feeds], [feed2.id, feed1.id])
 
+    def test_load_tweets(self):
+        tweets = [self.create_tweet(self.user2, f"tweet{i}") for i in range(3)]
+        for tweet in tweets:
+            self.create_newsfeed(self.user1, tweet)
+        self.clear_cache()
+
+        # cache miss, one query for all the tweets
+        newsfeeds = NewsFeedServices.get_cached_newsfeeds(self.user1.id)
+        with self.assertNumQueries(1):
+            NewsFeedServices.load_tweets(newsfeeds)
+        self.assertEqual(
+            [f.cached_tweet() for f in newsfeeds], [t for t in tweets[::-1]]
+        )
+
+        # cache hit, only the ids are cached in the newsfeeds list
+        newsfeeds = NewsFeedServices.get_cached_newsfeeds(self.user1.id)
+        with self.assertNumQueries(0):
+            NewsFeedServices.load_tweets(newsfeeds)
+            self.assertEqual([f.user_id for f in newsfeeds], [self.user1.id] * 3)
+            self.assertEqual(
+                [f.cached_tweet().content for f in newsfeeds],
+                ["tweet2", "tweet1", "tweet0"],
+            )
+
 
 class NewsFeedTaskTests(TestCase):
     def setUp(self):
@@ -89,3 +119,69 @@ class NewsFeedTaskTests(TestCase):
         self.assertEqual(len(cached_list), 3)
         cached_list = NewsFeedServices.get_cached_newsfeeds(self.user2.id)
         self.assertEqual(len(cached_list), 3)
+
+    def test_fanout_newsfeeds_main_task_in_pull_mode(self):
+        followers = []
+        for i in range(PULL_MODE_FOLLOWERS_THRESHOLD + 1):
+            user = self.create_user(f"follower{i}", f"follower{i}@example.com")
+            self.create_friendship(user, self.user1)
+            followers.append(user)
+
+        # the tweet is not fanned out, only the author's newsfeed is created
+        tweet = self.create_tweet(self.user1, "tweet1")
+        msg = fanout_newsfeeds_main_task(tweet.id, self.user1.id)
+        self.assertEqual(
+            msg,
+            "{} followers will pull the tweet, 0 batch created.".format(
+                PULL_MODE_FOLLOWERS_THRESHOLD + 1
+            ),
+        )
+        self.assertEqual(NewsFeed.objects.count(), 1)
+        self.assertTrue(NewsFeedServices.is_pull_mode_user(self.user1.id))
+
+        # the followers pull the tweet when reading the newsfeeds
+        self.assertEqual(
+            NewsFeedServices.get_pull_mode_followees(followers[0].id),
+            {self.user1.id: tweet.id},
+        )
+        # the users who do not follow the account do not pull it
+        self.assertEqual(NewsFeedServices.get_pull_mode_followees(self.user2.id), {})
+
+        # the account stays in pull mode with fewer followers, and the state
+        # is reloaded from db when the cache is lost
+        Friendship.objects.filter(to_user=self.user1).delete()
+        self.clear_cache()
+        self.create_friendship(followers[0], self.user1)
+        msg = fanout_newsfeeds_main_task(
+            self.create_tweet(self.user1, "tweet2").id, self.user1.id
+        )
+        self.assertEqual(msg, "The account is in pull mode, 0 batch created.")
+        self.assertEqual(NewsFeed.objects.filter(user=followers[0]).count(), 0)
+        self.assertEqual(
+            NewsFeedServices.get_pull_mode_followees(followers[0].id),
+            {self.user1.id: tweet.id},
+        )
+
+    def test_backfill_and_retract_newsfeeds(self):
+        old_tweets = [self.create_tweet(self.user2) for _ in range(2)]
+        tweet = self.create_tweet(self.user1)
+        self.create_newsfeed(self.user1, tweet)
+        NewsFeedServices.get_cached_newsfeeds(self.user1.id)
+
+        # the past tweets are merged in the order of their created time
+        friendship = self.create_friendship(self.user1, self.user2)
+        msg = backfill_newsfeeds_task(self.user1.id, self.user2.id)
+        self.assertEqual(msg, "2 newsfeeds backfilled.")
+        newsfeeds = NewsFeedServices.get_cached_newsfeeds(self.user1.id)
+        self.assertEqual(
+            [f.tweet_id for f in newsfeeds],
+            [tweet.id, old_tweets[1].id, old_tweets[0].id],
+        )
+
+        friendship.delete()
+        msg = retract_newsfeeds_task(self.user1.id, self.user2.id)
+        self.assertEqual(msg, "2 newsfeeds retracted.")
+        newsfeeds = NewsFeedServices.get_cached_newsfeeds(self.user1.id)
+        self.assertEqual([f.tweet_id for f in newsfeeds], [tweet.id])
+        msg = backfill_newsfeeds_task(self.user1.id, self.user2.id)
+        self.assertEqual(msg, "0 newsfeeds backfilled, the followee is unfollowed.")
@@ -1,18 +1,22 @@
+from django.contrib.auth.models import User
 from django.forms import ValidationError
+from django.utils.functional import cached_property
 from rest_framework import serializers
 
 from accounts.api.serializers import UserSerializerForTweet
 from comments.api.serializers import CommentSerializer
-from likes.api.serializers import LikeSerializer
-from likes.services import LikeService
-from tweets.constants import TWEET_PHOTOS_UPLOAD_LIMIT
+from comments.services import CommentService
+from likes.api.serializers import HasLikedMixin, LikeSerializer
+from tweets.constants import TWEET_DETAIL_PREVIEW_SIZE, TWEET_PHOTOS_UPLOAD_LIMIT
 from tweets.models import Tweet
 from tweets.services import TweetService
-from utils.redis_helper import RedisHelper
+from utils.memcached_helper import MemcachedHelper
+from utils.paginations import EndlessPagination
+from utils.serializers import CachedCountsMixin, PrimedListSerializer
 
 
-class TweetSerializer(serializers.ModelSerializer):
-    user = UserSerializerForTweet()
+class TweetSerializer(serializers.ModelSerializer, HasLikedMixin, CachedCountsMixin):
+    user = UserSerializerForTweet(source="cached_user")
     comments_count = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
     has_liked = serializers.SerializerMethodField()
@@ -30,25 +34,33 @@ class TweetSerializer(serializers.ModelSerializer):
             "has_liked",
             "photo_urls",
         )
+        list_serializer_class = PrimedListSerializer
+
+    def prime(self, tweets):
+        MemcachedHelper.prime_cached_objects(tweets, User, "user_id", "_cached_user")
+        self.fields["user"].prime([tweet.cached_user for tweet in tweets])
+        self.prime_has_liked(tweets)
+        self.prime_counts(tweets, "likes_count", "comments_count")
+        photo_urls_map = self.context.setdefault("photo_urls_map", {})
+        photo_urls_map.update(
+            TweetService.get_photo_urls_map([tweet.id for tweet in tweets])
+        )
 
     def get_likes_count(self, obj):
         # select count(*)  -> redis get
         # N+ 1 Query
         # N 如果是 db query 是不可以接受的
         # 但是如果是 redis query, 就可以接受
-        return RedisHelper.get_count(obj, "likes_count")
+        return self.get_cached_count(obj, "likes_count")
 
     def get_comments_count(self, obj):
-        return RedisHelper.get_count(obj, "comments_count")
-
-    def get_has_liked(self, obj):
-        return LikeService.has_liked(self.context["request"].user, obj)
+        return self.get_cached_count(obj, "comments_count")
 
     def get_photo_urls(self, obj):
-        photo_urls = []
-        for photo in obj.tweetphoto_set.all().order_by("order"):
-            photo_urls.append(photo.file.url)
-        return photo_urls
+        photo_urls_map = self.context.get("photo_urls_map", {})
+        if obj.id in photo_urls_map:
+            return photo_urls_map[obj.id]
+        return TweetService.get_photo_urls_map([obj.id])[obj.id]
 
 
 class TweetSerializerForCreate(serializers.ModelSerializer):
@@ -89,21 +101,62 @@ class TweetSerializerForCreate(serializers.ModelSerializer):
 
 
 class TweetSerializerForDetail(TweetSerializer):
-    comments = CommentSerializer(source="comment_set", many=True)
-    likes = LikeSerializer(source="like_set", many=True)
+    comments = serializers.SerializerMethodField()
+    comments_next_cursor = serializers.SerializerMethodField()
+    likes = serializers.SerializerMethodField()
+    likes_next_cursor = serializers.SerializerMethodField()
 
     class Meta:
         model = Tweet
         fields = (
             "id",
             "user",
-            "comments",
             "created_at",
             "content",
-            "likes",
             "comments",
+            "comments_next_cursor",
+            "likes",
+            "likes_next_cursor",
             "likes_count",
             "comments_count",
             "has_liked",
             "photo_urls",
         )
+
+    def get_preview(self, objects):
+        # the newest TWEET_DETAIL_PREVIEW_SIZE objects, and the cursor of the
+        # next page if there are more
+        objects = list(objects[: TWEET_DETAIL_PREVIEW_SIZE + 1])
+        if len(objects) <= TWEET_DETAIL_PREVIEW_SIZE:
+            return objects, None
+        objects = objects[:TWEET_DETAIL_PREVIEW_SIZE]
+        return objects, EndlessPagination.encode_cursor(objects[-1])
+
+    @cached_property
+    def comments_preview(self):
+        comments = CommentService.get_first_comments(
+            self.instance.id, TWEET_DETAIL_PREVIEW_SIZE + 1
+        )
+        comments, next_cursor = self.get_preview(comments)
+        return CommentService.load_comments(comments), next_cursor
+
+    @cached_property
+    def likes_preview(self):
+        likes = self.instance.like_set.order_by("-created_at", "-id")
+        return self.get_preview(likes)
+
+    def get_comments(self, obj):
+        comments, _ = self.comments_preview
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    def get_comments_next_cursor(self, obj):
+        _, next_cursor = self.comments_preview
+        return next_cursor
+
+    def get_likes(self, obj):
+        likes, _ = self.likes_preview
+        return LikeSerializer(likes, many=True, context=self.context).data
+
+    def get_likes_next_cursor(self, obj):
+        _, next_cursor = self.likes_preview
+        return next_cursor
@@ -1,14 +1,23 @@
+import base64
+
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
 from testing.testcases import TestCase
+from tweets.constants import TWEET_DETAIL_PREVIEW_SIZE
 from tweets.models import Tweet, TweetPhoto
+from twitter.cache import TWEET_COMMENTS_PATTERN
 from utils.paginations import EndlessPagination
+from utils.redis_client import RedisClient
 
 # need "/", if not, will cause the 301 redirect error
 TWEET_LIST_API = "/api/tweets/"
 TWEET_CREATE_API = "/api/tweets/"
 TWEET_RETRIEVE_API = "/api/tweets/{}/"
+TWEET_LIKES_API = "/api/tweets/{}/likes/"
+COMMENT_LIST_API = "/api/comments/"
 
 
 class TweetApiTests(TestCase):
@@ -88,6 +97,110 @@ class TweetApiTests(TestCase):
         response = self.anonymous_client.get(url)
         self.assertEqual(len(response.data["comments"]), 2)
 
+    def test_retrieve_previews(self):
+        tweet = self.tweets1[0]
+        url = TWEET_RETRIEVE_API.format(tweet.id)
+        size = TWEET_DETAIL_PREVIEW_SIZE
+        comments = [self.create_comment(self.user2, tweet) for _ in range(size + 1)]
+        likers = [
+            self.create_user(f"liker{i}", f"liker{i}@gmail.com")
+            for i in range(size + 1)
+        ]
+        likes = [self.create_like(liker, tweet) for liker in likers]
+        comments, likes = comments[::-1], likes[::-1]
+
+        # only the newest comments and likes are embedded
+        response = self.anonymous_client.get(url)
+        self.assertEqual(
+            [comment["id"] for comment in response.data["comments"]],
+            [comment.id for comment in comments[:size]],
+        )
+        self.assertEqual(
+            [like["user"]["id"] for like in response.data["likes"]],
+            [like.user_id for like in likes[:size]],
+        )
+
+        # the cursors continue on the comments and likes endpoints
+        response_comments = self.anonymous_client.get(
+            COMMENT_LIST_API,
+            {"tweet_id": tweet.id, "cursor": response.data["comments_next_cursor"]},
+        )
+        self.assertEqual(
+            [comment["id"] for comment in response_comments.data["results"]],
+            [comments[size].id],
+        )
+        response_likes = self.anonymous_client.get(
+            TWEET_LIKES_API.format(tweet.id),
+            {"cursor": response.data["likes_next_cursor"]},
+        )
+        self.assertEqual(
+            [like["user"]["id"] for like in response_likes.data["results"]],
+            [likes[size].user_id],
+        )
+        self.assertEqual(response_likes.data["has_next_page"], False)
+
+        # no cursor if all the comments and likes are embedded
+        response = self.anonymous_client.get(
+            TWEET_RETRIEVE_API.format(self.tweets1[1].id)
+        )
+        self.assertEqual(response.data["comments_next_cursor"], None)
+        self.assertEqual(response.data["likes_next_cursor"], None)
+
+    def test_retrieve_comments_preview_cache_miss(self):
+        tweet = self.tweets1[0]
+        size = TWEET_DETAIL_PREVIEW_SIZE
+        comments = [self.create_comment(self.user2, tweet) for _ in range(size + 2)]
+        comments = comments[::-1]
+        self.clear_cache()
+
+        # a cold cache reads only the preview, the comments are not cached
+        with CaptureQueriesContext(connection) as captured:
+            response = self.anonymous_client.get(TWEET_RETRIEVE_API.format(tweet.id))
+        self.assertEqual(
+            [comment["id"] for comment in response.data["comments"]],
+            [comment.id for comment in comments[:size]],
+        )
+        self.assertNotEqual(response.data["comments_next_cursor"], None)
+        comment_queries = [
+            query["sql"]
+            for query in captured.captured_queries
+            if 'WHERE "comments_comment"."tweet_id"' in query["sql"]
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertIn(f"LIMIT {size + 1}", comment_queries[0])
+        key = TWEET_COMMENTS_PATTERN.format(tweet_id=tweet.id)
+        self.assertFalse(RedisClient.get_connection().exists(key))
+
+        # the cached list is used once the comments are listed
+        self.anonymous_client.get(COMMENT_LIST_API, {"tweet_id": tweet.id})
+        with CaptureQueriesContext(connection) as captured:
+            response = self.anonymous_client.get(TWEET_RETRIEVE_API.format(tweet.id))
+        self.assertEqual(
+            [comment["id"] for comment in response.data["comments"]],
+            [comment.id for comment in comments[:size]],
+        )
+        self.assertFalse(
+            any(
+                'WHERE "comments_comment"."tweet_id"' in query["sql"]
+                for query in captured.captured_queries
+            )
+        )
+
+    def test_likes_api(self):
+        tweet = self.tweets1[0]
+        response = self.anonymous_client.get(TWEET_LIKES_API.format(-1))
+        self.assertEqual(response.status_code, 404)
+
+        self.create_like(self.user1, tweet)
+        self.create_like(self.user2, tweet)
+        response = self.anonymous_client.get(TWEET_LIKES_API.format(tweet.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [like["user"]["id"] for like in response.data["results"]],
+            [self.user2.id, self.user1.id],
+        )
+        self.assertEqual(response.data["has_next_page"], False)
+
     def test_create_with_files(self):
         """test the uploading files to tweet"""
         # test uploading ZERO image and content only successfully
@@ -222,3 +335,49 @@ class TweetApiTests(TestCase):
         self.assertEqual(response.data["has_next_page"], False)
         self.assertEqual(len(response.data["results"]), 1)
         self.assertEqual(response.data["results"][0]["id"], new_tweet.id)
+
+    def _paginate_by_cursor(self, user_id):
+        response = self.anonymous_client.get(TWEET_LIST_API, {"user_id": user_id})
+        results = response.data["results"]
+        while response.data["has_next_page"]:
+            response = self.anonymous_client.get(
+                TWEET_LIST_API,
+                {"user_id": user_id, "cursor": response.data["next_cursor"]},
+            )
+            results.extend(response.data["results"])
+        self.assertEqual(response.data["next_cursor"], None)
+        return [tweet["id"] for tweet in results]
+
+    def test_cursor_pagination_with_same_created_at(self):
+        page_size = EndlessPagination.page_size
+        for i in range(page_size * 2):
+            self.tweets1.append(self.create_tweet(self.user1, f"tweet{i}"))
+        # half of the tweets are created at the same time
+        created_at = self.tweets1[page_size].created_at
+        Tweet.objects.filter(
+            id__in=[tweet.id for tweet in self.tweets1[page_size // 2 :]]
+        ).update(created_at=created_at)
+        self.clear_cache()
+        tweet_ids = list(
+            Tweet.objects.filter(user=self.user1)
+            .order_by("-created_at", "-id")
+            .values_list("id", flat=True)
+        )
+
+        # from the cached list
+        self.assertEqual(self._paginate_by_cursor(self.user1.id), tweet_ids)
+        # from the db, the cached list is only a part of all the tweets
+        with self.settings(REDIS_LIST_LENGTH_LIMIT=page_size):
+            self.clear_cache()
+            self.assertEqual(self._paginate_by_cursor(self.user1.id), tweet_ids)
+
+        response = self.anonymous_client.get(
+            TWEET_LIST_API, {"user_id": self.user1.id, "cursor": "invalid"}
+        )
+        self.assertEqual(response.status_code, 404)
+        # a naive datetime cannot be compared with the cached tweets
+        naive_cursor = base64.urlsafe_b64encode(b"2020-01-01T00:00:00,1").decode()
+        response = self.anonymous_client.get(
+            TWEET_LIST_API, {"user_id": self.user1.id, "cursor": naive_cursor}
+        )
+        self.assertEqual(response.status_code, 404)
@@ -1,7 +1,9 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from likes.api.serializers import LikeSerializer
 from newsfeeds.services import NewsFeedServices
 from tweets.api.serializers import (
     TweetSerializer,
@@ -24,7 +26,7 @@ class TweetViewSet(viewsets.GenericViewSet):
     # GET /api/tweets/1/1 -> retrieve
     def get_permissions(self):
         # self.action --> (list, create) func
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "likes"]:
             return [AllowAny()]
         return [IsAuthenticated()]
 
@@ -35,6 +37,14 @@ class TweetViewSet(viewsets.GenericViewSet):
         )
         return Response(serializer.data)
 
+    @action(methods=["GET"], detail=True)
+    def likes(self, request, pk):
+        # GET /api/tweets/1/likes/?cursor=...
+        tweet = self.get_object()
+        page = self.paginate_queryset(tweet.like_set)
+        serializer = LikeSerializer(page, context={"request": request}, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @required_params(params=["user_id"])
     def list(self, request, *args, **kwargs):
         user_id = request.query_params["user_id"]
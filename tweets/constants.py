@@ -1,3 +1,6 @@
+from django.conf import settings
+
+
 class TweetPhotoStatus:
     PENDING = 0
     APPROVED = 1
@@ -12,3 +15,7 @@ TWEET_PHOTO_STATUS_CHOICES = (
 
 
 TWEET_PHOTOS_UPLOAD_LIMIT = 9
+
+# the detail of a tweet embeds the newest comments and likes only, the others
+# are read from the paginated comments and likes endpoints
+TWEET_DETAIL_PREVIEW_SIZE = 10 if not settings.TESTING_MODE else 3
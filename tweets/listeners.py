@@ -4,3 +4,9 @@ def push_tweet_to_cache(sender, instance, created, **kwargs):
     from tweets.services import TweetService
 
     TweetService.push_tweet_to_cache(instance)
+
+
+def invalidate_photo_urls_cache(sender, instance, **kwargs):
+    from tweets.services import TweetService
+
+    TweetService.invalidate_photo_urls(instance.tweet_id)
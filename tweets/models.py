@@ -5,7 +5,7 @@ from django.db.models.signals import post_save, pre_delete
 
 from likes.models import Like
 from tweets.constants import TWEET_PHOTO_STATUS_CHOICES, TweetPhotoStatus
-from tweets.listeners import push_tweet_to_cache
+from tweets.listeners import invalidate_photo_urls_cache, push_tweet_to_cache
 from utils.listeners import invalidate_object_cache
 from utils.memcached_helper import MemcachedHelper
 from utils.time_helpers import utc_now
@@ -55,6 +55,8 @@ class Tweet(models.Model):
 
     @property
     def cached_user(self):
+        if hasattr(self, "_cached_user"):
+            return self._cached_user
         return MemcachedHelper.get_object_through_cache(User, self.user_id)
 
 
@@ -96,3 +98,6 @@ post_save.connect(invalidate_object_cache, sender=Tweet)
 pre_delete.connect(invalidate_object_cache, sender=Tweet)
 # push the tweet into the redis
 post_save.connect(push_tweet_to_cache, sender=Tweet)
+# the photo urls of the tweet are cached in memcached
+post_save.connect(invalidate_photo_urls_cache, sender=TweetPhoto)
+pre_delete.connect(invalidate_photo_urls_cache, sender=TweetPhoto)
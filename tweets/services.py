@@ -1,7 +1,12 @@
+from django.conf import settings
+from django.core.cache import caches
+
 from tweets.models import Tweet, TweetPhoto
-from twitter.cache import USER_TWEETS_PATTERN
+from twitter.cache import TWEET_PHOTO_NAMES_PATTERN, USER_TWEETS_PATTERN
 from utils.redis_helper import RedisHelper
 
+cache = caches["testing"] if settings.TESTING_MODE else caches["default"]
+
 
 class TweetService:
     @classmethod
@@ -16,17 +21,68 @@ class TweetService:
             )
             photos.append(photo)
         TweetPhoto.objects.bulk_create(photos)
+        # bulk_create does not trigger the post_save listeners
+        cls.invalidate_photo_urls(tweet.id)
+
+    @classmethod
+    def get_photo_names_map(cls, tweet_ids):
+        # return {tweet_id: [photo file name]}, one get_many for all the
+        # tweets, and one query for the cache misses
+        keys = {
+            TWEET_PHOTO_NAMES_PATTERN.format(tweet_id=tweet_id): tweet_id
+            for tweet_id in tweet_ids
+        }
+        cached_photo_names = cache.get_many(keys.keys())
+        photo_names_map = {
+            keys[key]: names for key, names in cached_photo_names.items()
+        }
+
+        missed_ids = set(keys.values()) - photo_names_map.keys()
+        if not missed_ids:
+            return photo_names_map
+        missed_photo_names_map = {tweet_id: [] for tweet_id in missed_ids}
+        photos = TweetPhoto.objects.filter(tweet_id__in=missed_ids).order_by(
+            "tweet_id", "order"
+        )
+        for photo in photos:
+            missed_photo_names_map[photo.tweet_id].append(photo.file.name)
+        # the tweets without photos are cached too
+        cache.set_many(
+            {
+                TWEET_PHOTO_NAMES_PATTERN.format(tweet_id=tweet_id): names
+                for tweet_id, names in missed_photo_names_map.items()
+            }
+        )
+        photo_names_map.update(missed_photo_names_map)
+        return photo_names_map
+
+    @classmethod
+    def get_photo_urls_map(cls, tweet_ids):
+        # return {tweet_id: [photo url]}. the file names are cached rather
+        # than the urls, the s3 urls are signed and expire long before the
+        # cache does, so they are built on every call
+        storage = TweetPhoto._meta.get_field("file").storage
+        return {
+            tweet_id: [storage.url(name) for name in names]
+            for tweet_id, names in cls.get_photo_names_map(tweet_ids).items()
+        }
+
+    @classmethod
+    def invalidate_photo_urls(cls, tweet_id):
+        cache.delete(TWEET_PHOTO_NAMES_PATTERN.format(tweet_id=tweet_id))
 
     @classmethod
     def get_cached_tweets(cls, user_id):
         # Queryset is lazy loading
-        queryset = Tweet.objects.filter(user_id=user_id).order_by("-created_at")
+        queryset = Tweet.objects.filter(user_id=user_id).order_by("-created_at", "-id")
         key = USER_TWEETS_PATTERN.format(user_id=user_id)
         return RedisHelper.load_objects(key, queryset)
 
     @classmethod
     def push_tweet_to_cache(cls, tweet):
         # Queryset is lazy loading
-        queryset = Tweet.objects.filter(user_id=tweet.user_id).order_by("-created_at")
+        queryset = Tweet.objects.filter(user_id=tweet.user_id).order_by(
+            "-created_at", "-id"
+        )
         key = USER_TWEETS_PATTERN.format(user_id=tweet.user_id)
         RedisHelper.push_object(key, tweet, queryset)
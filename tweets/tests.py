@@ -1,4 +1,5 @@
 from datetime import timedelta
+from unittest.mock import patch
 
 from django.contrib.auth.models import User
 
@@ -100,3 +101,45 @@ class TweetServiceTests(TestCase):
 
         tweets = TweetService.get_cached_tweets(self.user1.id)
         self.assertEqual([t.id for t in tweets], [tweet2.id, tweet1.id])
+
+    def test_get_photo_urls_map(self):
+        tweets = [self.create_tweet(self.user1) for _ in range(2)]
+        for order in [1, 0]:
+            TweetPhoto.objects.create(
+                tweet=tweets[0],
+                user=self.user1,
+                file=f"photo{order}.jpg",
+                order=order,
+            )
+        tweet_ids = [tweet.id for tweet in tweets]
+
+        # the urls of all the tweets are loaded with one query
+        with self.assertNumQueries(1):
+            photo_urls_map = TweetService.get_photo_urls_map(tweet_ids)
+        self.assertEqual(len(photo_urls_map[tweets[0].id]), 2)
+        self.assertTrue(photo_urls_map[tweets[0].id][0].endswith("photo0.jpg"))
+        self.assertEqual(photo_urls_map[tweets[1].id], [])
+        with self.assertNumQueries(0):
+            self.assertEqual(TweetService.get_photo_urls_map(tweet_ids), photo_urls_map)
+
+        # the file names are cached, the signed urls are built on every call
+        storage = TweetPhoto._meta.get_field("file").storage
+        with patch.object(storage, "url", side_effect=lambda name: f"signed/{name}"):
+            self.assertEqual(
+                TweetService.get_photo_urls_map(tweet_ids)[tweets[0].id],
+                ["signed/photo0.jpg", "signed/photo1.jpg"],
+            )
+
+        # the cached urls are invalidated when the photos change
+        photo = TweetPhoto.objects.create(
+            tweet=tweets[1],
+            user=self.user1,
+            file="photo2.jpg",
+        )
+        self.assertEqual(
+            len(TweetService.get_photo_urls_map(tweet_ids)[tweets[1].id]), 1
+        )
+        photo.status = TweetPhotoStatus.REJECTED
+        photo.save()
+        with self.assertNumQueries(1):
+            TweetService.get_photo_urls_map(tweet_ids)
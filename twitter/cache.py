@@ -1,7 +1,45 @@
 # Memcached
-FOLLOWINGS_PATTERN = "followings:{user_id}"
 USER_PROFILE_PATTERN = "userprofile:{user_id}"
+TWEET_PHOTO_NAMES_PATTERN = "tweet_photo_names:{tweet_id}"
 
 # redis
 USER_TWEETS_PATTERN = "user_tweets:{user_id}"
 USER_NEWSFEEDS_PATTERN = "newsfeeds:{user_id}"
+TWEET_COMMENTS_PATTERN = "tweet_comments:{tweet_id}"
+# cached from UserProfile.pull_mode_since_tweet_id, the id set of the pull mode
+# users, and the first tweet of a pull mode user which is not fanned out
+PULL_MODE_USERS_KEY = "pull_mode_users"
+PULL_MODE_SINCE_TWEET_ID_PATTERN = "pull_mode_since_tweet_id:{user_id}"
+# id sets and counters changed by the friendship listeners
+FOLLOWINGS_SET_PATTERN = "followings_set:{user_id}"
+FOLLOWERS_SET_PATTERN = "followers_set:{user_id}"
+FOLLOWINGS_COUNT_PATTERN = "followings_count:{user_id}"
+FOLLOWERS_COUNT_PATTERN = "followers_count:{user_id}"
+# write-behind counters, hash of "{model label},{attr},{id}" -> pending delta
+COUNT_DELTAS_KEY = "count_deltas"
+COUNT_DELTAS_FLUSHING_KEY = "count_deltas:flushing"
+COUNT_DELTAS_FLUSH_LOCK_KEY = "count_deltas:flush_lock"
+# notifications waiting to be inserted by deliver_notifications_task
+PENDING_NOTIFICATIONS_KEY = "pending_notifications"
+# the batch claimed by the lock holder, dropped once it is inserted
+PENDING_NOTIFICATIONS_PROCESSING_KEY = "pending_notifications:processing"
+PENDING_NOTIFICATIONS_LOCK_KEY = "pending_notifications:lock"
+UNREAD_NOTIFICATIONS_COUNT_PATTERN = "unread_notifications_count:{user_id}"
+
+# serializers of the redis cached lists, see utils/redis_serializers.py
+# format "django": the django json format
+# format "compact": msgpack array of the values of all the fields, or of the
+# given fields only
+REDIS_LIST_SERIALIZERS = {
+    USER_TWEETS_PATTERN: {"format": "compact"},
+    # only the ids, the tweets are loaded in bulk when rendering the newsfeeds
+    USER_NEWSFEEDS_PATTERN: {
+        "format": "compact",
+        "fields": ("id", "tweet_id", "created_at"),
+    },
+    # only the ids, the comments are loaded in bulk through memcached
+    TWEET_COMMENTS_PATTERN: {
+        "format": "compact",
+        "fields": ("id", "created_at"),
+    },
+}
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
     "newsfeeds",
     "comments",
     "likes",
+    "inbox",
 ]
 
 REST_FRAMEWORK = {
@@ -70,6 +71,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "utils.middlewares.IdentityMapMiddleware",
 ]
 
 ROOT_URLCONF = "twitter.urls"
@@ -193,6 +195,25 @@ REDIS_DB = 0 if TESTING_MODE else 1
 REDIS_KEY_EXPIRE_TIME = 7 * 86400  # in seconds
 # size of limit should be larger than the pagination size
 REDIS_LIST_LENGTH_LIMIT = 200 if not TESTING_MODE else 20
+# only one request loads a missed list from db, the others wait for it at most
+# REDIS_FILL_WAIT_TIME and then read the db without writing the cache
+REDIS_FILL_LOCK_EXPIRE_TIME = 10  # in seconds
+REDIS_FILL_WAIT_TIME = 0.2  # in seconds
+# write-behind counters: the likes and comments only change the counters in
+# redis, the deltas are flushed to db every COUNT_DELTAS_FLUSH_INTERVAL.
+# set it False to update the db counters synchronously
+COUNTERS_WRITE_BEHIND = not TESTING_MODE
+COUNT_DELTAS_FLUSH_INTERVAL = 10  # in seconds
+COUNT_DELTAS_FLUSH_LOCK_EXPIRE_TIME = 60  # in seconds
+# only one worker inserts the pending notifications at a time, the lock is
+# extended for every batch. the pending notifications left by a crashed worker
+# are swept every PENDING_NOTIFICATIONS_SWEEP_INTERVAL
+PENDING_NOTIFICATIONS_LOCK_EXPIRE_TIME = 60  # in seconds
+PENDING_NOTIFICATIONS_SWEEP_INTERVAL = 60  # in seconds
+# the notifications of the same (recipient, verb, target) within the window
+# are aggregated into one row, "A and 41 others liked your tweet."
+# set it 0 to insert one row per notification
+NOTIFICATION_AGGREGATION_WINDOW = 3600  # in seconds
 
 # Celery configuration OPTIONS
 CELERY_BROKER_URL = (
@@ -203,7 +224,18 @@ CELERY_TASK_ALWAYS_EAGER = TESTING_MODE
 CELERY_QUEUE = (
     Queue("default", routing_key="default"),
     Queue("newsfeeds", routing_key="newsfeeds"),
+    Queue("notifications", routing_key="notifications"),
 )
+CELERY_BEAT_SCHEDULE = {
+    "flush-count-deltas": {
+        "task": "core.tasks.flush_count_deltas_task",
+        "schedule": COUNT_DELTAS_FLUSH_INTERVAL,
+    },
+    "deliver-pending-notifications": {
+        "task": "inbox.tasks.deliver_notifications_task",
+        "schedule": PENDING_NOTIFICATIONS_SWEEP_INTERVAL,
+    },
+}
 
 try:
     from .local_settings import *
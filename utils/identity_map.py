@@ -0,0 +1,63 @@
+import threading
+
+# the requests are served by a thread each under wsgi. identity_map is the
+# {(namespace, object_id): obj} of the current request, None out of requests
+_local = threading.local()
+
+
+class IdentityMap:
+    """
+    Keep the objects loaded during a request by (namespace, object_id), so
+    that the same user or profile is fetched from the cache at most once per
+    request. The namespace is usually the model class. Installed by
+    IdentityMapMiddleware, every method is a no-op outside a request.
+    """
+
+    @classmethod
+    def _get_identity_map(cls):
+        return getattr(_local, "identity_map", None)
+
+    @classmethod
+    def start(cls):
+        # return the map of the outer request as the token to restore
+        token = cls._get_identity_map()
+        _local.identity_map = {}
+        return token
+
+    @classmethod
+    def stop(cls, token):
+        _local.identity_map = token
+
+    @classmethod
+    def get_many(cls, namespace, object_ids):
+        identity_map = cls._get_identity_map()
+        if identity_map is None:
+            return {}
+        return {
+            object_id: identity_map[(namespace, object_id)]
+            for object_id in object_ids
+            if (namespace, object_id) in identity_map
+        }
+
+    @classmethod
+    def get(cls, namespace, object_id):
+        return cls.get_many(namespace, [object_id]).get(object_id)
+
+    @classmethod
+    def set_many(cls, namespace, objects):
+        identity_map = cls._get_identity_map()
+        if identity_map is None:
+            return
+        for object_id, obj in objects.items():
+            identity_map[(namespace, object_id)] = obj
+
+    @classmethod
+    def set(cls, namespace, object_id, obj):
+        cls.set_many(namespace, {object_id: obj})
+
+    @classmethod
+    def discard(cls, namespace, object_id):
+        identity_map = cls._get_identity_map()
+        if identity_map is None:
+            return
+        identity_map.pop((namespace, object_id), None)
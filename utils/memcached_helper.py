@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.core.cache import caches
 
+from utils.identity_map import IdentityMap
+
 cache = caches["testing"] if settings.TESTING_MODE else caches["default"]
 
 
@@ -11,19 +13,70 @@ class MemcachedHelper:
 
     @classmethod
     def get_object_through_cache(cls, model_class, object_id):
+        # loaded before in the same request
+        obj = IdentityMap.get(model_class, object_id)
+        if obj is not None:
+            return obj
+
         key = cls.get_key(model_class, object_id)
         # if cache hit
         obj = cache.get(key)
         if obj:
+            IdentityMap.set(model_class, object_id, obj)
             return obj
 
         # if cache miss
         obj = model_class.objects.get(id=object_id)
         # using default expire time
         cache.set(key, obj)
+        IdentityMap.set(model_class, object_id, obj)
         return obj
 
+    @classmethod
+    def get_objects_through_cache(cls, model_class, object_ids):
+        # return {object_id: obj}, one get_many for all the objects,
+        # and one query for all the cache misses
+        object_ids = {object_id for object_id in object_ids if object_id is not None}
+        objects = IdentityMap.get_many(model_class, object_ids)
+        keys = {
+            cls.get_key(model_class, object_id): object_id
+            for object_id in object_ids - objects.keys()
+        }
+        if keys:
+            cached_objects = cache.get_many(keys.keys())
+            objects.update({keys[key]: obj for key, obj in cached_objects.items()})
+
+        missed_ids = object_ids - objects.keys()
+        if missed_ids:
+            missed_objects = model_class.objects.in_bulk(missed_ids)
+            cache.set_many(
+                {
+                    cls.get_key(model_class, object_id): obj
+                    for object_id, obj in missed_objects.items()
+                }
+            )
+            objects.update(missed_objects)
+        IdentityMap.set_many(model_class, objects)
+        return objects
+
+    @classmethod
+    def prime_cached_objects(cls, instances, model_class, id_attr, cached_attr):
+        # load the objects referred by instance.<id_attr> in bulk and keep
+        # them in instance.<cached_attr>, which the cached_xxx properties read
+        instances = [
+            instance for instance in instances if not hasattr(instance, cached_attr)
+        ]
+        if not instances:
+            return
+        objects = cls.get_objects_through_cache(
+            model_class,
+            [getattr(instance, id_attr) for instance in instances],
+        )
+        for instance in instances:
+            setattr(instance, cached_attr, objects.get(getattr(instance, id_attr)))
+
     @classmethod
     def invalidate_cached_object(cls, model_class, object_id):
         key = cls.get_key(model_class, object_id)
         cache.delete(key)
+        IdentityMap.discard(model_class, object_id)
@@ -0,0 +1,14 @@
+from utils.identity_map import IdentityMap
+
+
+class IdentityMapMiddleware:
+    # one identity map per request, dropped when the response is returned
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = IdentityMap.start()
+        try:
+            return self.get_response(request)
+        finally:
+            IdentityMap.stop(token)
@@ -1,65 +1,160 @@
+import base64
+import binascii
+
 from dateutil import parser
 from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
 
 
 class EndlessPagination(BasePagination):
     page_size = 20 if not settings.TESTING_MODE else 10
+    invalid_cursor_message = "Invalid cursor"
+    # the objects are ordered by (ordering_field, id) desc
+    ordering_field = "created_at"
 
     def __init__(self):
         super().__init__()
         self.has_next_page = False
+        self.next_cursor = None
 
     def to_html(self):
         pass
 
-    def paginate_ordered_list(self, reversed_order_list, request):
-        if "created_at__gt" in request.query_params:
-            created_at__gt = parser.isoparse(request.query_params["created_at__gt"])
-            objects = []
-            for obj in reversed_order_list:
-                if obj.created_at > created_at__gt:
-                    objects.append(obj)
-                else:
-                    break
+    @classmethod
+    def encode_cursor(cls, obj):
+        # the cursor is the (ordering_field, id) of the last object of the
+        # page, the objects built in memory without id use 0
+        ordered_at = getattr(obj, cls.ordering_field)
+        cursor = f"{ordered_at.isoformat()},{obj.id or 0}"
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    def decode_cursor(self, request):
+        try:
+            cursor = base64.urlsafe_b64decode(request.query_params["cursor"].encode())
+            ordered_at, object_id = cursor.decode().split(",")
+            ordered_at, object_id = parser.isoparse(ordered_at), int(object_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # the cursors are encoded from aware datetimes, a naive one cannot be
+        # compared with the objects
+        if ordered_at.tzinfo is None:
+            raise NotFound(self.invalid_cursor_message)
+        return ordered_at, object_id
+
+    @classmethod
+    def bisect(cls, reversed_ordered_list, is_older):
+        # binary search the first index of the objects which is_older, the
+        # list is ordered by (ordering_field, id) desc, so is_older of the objects
+        # is like [False, False, ..., True, True]
+        low, high = 0, len(reversed_ordered_list)
+        while low < high:
+            mid = (low + high) // 2
+            if is_older(reversed_ordered_list[mid]):
+                high = mid
+            else:
+                low = mid + 1
+        return low
+
+    def get_ordered_at(self, obj):
+        return getattr(obj, self.ordering_field)
+
+    def paginate_ordered_list(self, reversed_ordered_list, request):
+        gt_param, lt_param = f"{self.ordering_field}__gt", f"{self.ordering_field}__lt"
+        if gt_param in request.query_params:
+            ordered_at__gt = parser.isoparse(request.query_params[gt_param])
+            index = self.bisect(
+                reversed_ordered_list,
+                lambda obj: self.get_ordered_at(obj) <= ordered_at__gt,
+            )
             self.has_next_page = False
-            return objects
+            return reversed_ordered_list[:index]
 
         index = 0
-        if "created_at__lt" in request.query_params:
-            created_at__lt = parser.isoparse(request.query_params["created_at__lt"])
-            for index, obj in enumerate(reversed_order_list):
-                if obj.created_at < created_at__lt:
-                    break
-            else:
-                reversed_order_list = []
-        self.has_next_page = len(reversed_order_list) > index + self.page_size
-        return reversed_order_list[index : index + self.page_size]
+        # an empty cursor asks for the first page
+        if request.query_params.get("cursor"):
+            cursor = self.decode_cursor(request)
+            index = self.bisect(
+                reversed_ordered_list,
+                lambda obj: (self.get_ordered_at(obj), obj.id or 0) < cursor,
+            )
+        elif lt_param in request.query_params:
+            ordered_at__lt = parser.isoparse(request.query_params[lt_param])
+            index = self.bisect(
+                reversed_ordered_list,
+                lambda obj: self.get_ordered_at(obj) < ordered_at__lt,
+            )
+        self.has_next_page = len(reversed_ordered_list) > index + self.page_size
+        return self.get_page(reversed_ordered_list[index : index + self.page_size])
 
     def paginate_queryset(self, queryset, request, view=None):
         if type(queryset) == list:
             return self.paginate_ordered_list(queryset, request)
 
+        field = self.ordering_field
+        ordering = (f"-{field}", "-id")
         # (gt=greater than)
-        if "created_at__gt" in request.query_params:
-            created_at__gt = request.query_params["created_at__gt"]
-            queryset = queryset.filter(created_at__gt=created_at__gt)
+        if f"{field}__gt" in request.query_params:
+            ordered_at__gt = request.query_params[f"{field}__gt"]
+            queryset = queryset.filter(**{f"{field}__gt": ordered_at__gt})
             self.has_next_page = False
-            return queryset.order_by("-created_at")
+            return queryset.order_by(*ordering)
 
+        # keyset of (ordering_field, id), the rows with the same ordering_field
+        # would not be skipped or duplicated
+        if request.query_params.get("cursor"):
+            ordered_at, object_id = self.decode_cursor(request)
+            queryset = queryset.filter(
+                Q(**{f"{field}__lt": ordered_at})
+                | Q(**{field: ordered_at, "id__lt": object_id})
+            )
         # (lt=less than)
-        if "created_at__lt" in request.query_params:
-            created_at__lt = request.query_params["created_at__lt"]
-            queryset = queryset.filter(created_at__lt=created_at__lt)
+        elif f"{field}__lt" in request.query_params:
+            ordered_at__lt = request.query_params[f"{field}__lt"]
+            queryset = queryset.filter(**{f"{field}__lt": ordered_at__lt})
 
-        queryset = queryset.order_by("-created_at")[: self.page_size + 1]
+        queryset = queryset.order_by(*ordering)[: self.page_size + 1]
         self.has_next_page = len(queryset) > self.page_size
-        return queryset[: self.page_size]
+        return self.get_page(queryset[: self.page_size])
+
+    def merge_pages(self, pages, request, unique_field=None):
+        # merge the (page, has_next_page) of several sources paginated by the
+        # same request, every page is the head of its source, so the head of
+        # the merged objects is the page of all of them. the objects with the
+        # same unique_field are kept once, the first in order
+        objects = sorted(
+            [obj for page, _ in pages for obj in page],
+            key=lambda obj: (self.get_ordered_at(obj), obj.id or 0),
+            reverse=True,
+        )
+        if unique_field is not None:
+            seen = set()
+            unique_objects = []
+            for obj in objects:
+                value = getattr(obj, unique_field)
+                if value not in seen:
+                    seen.add(value)
+                    unique_objects.append(obj)
+            objects = unique_objects
+        if f"{self.ordering_field}__gt" in request.query_params:
+            self.has_next_page = False
+            return objects
+        self.has_next_page = len(objects) > self.page_size or any(
+            has_next_page for _, has_next_page in pages
+        )
+        return self.get_page(objects[: self.page_size])
+
+    def get_page(self, page):
+        self.next_cursor = None
+        if self.has_next_page:
+            self.next_cursor = self.encode_cursor(page[len(page) - 1])
+        return page
 
     def paginate_cached_list(self, cached_list, request):
         paginated_list = self.paginate_ordered_list(cached_list, request)
-        if "created_at__gt" in request.query_params:
+        if f"{self.ordering_field}__gt" in request.query_params:
             return paginated_list
         if self.has_next_page:
             return paginated_list
@@ -71,6 +166,7 @@ class EndlessPagination(BasePagination):
         return Response(
             {
                 "has_next_page": self.has_next_page,
+                "next_cursor": self.next_cursor,
                 "results": data,
             }
         )
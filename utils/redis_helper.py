@@ -1,92 +1,673 @@
+import time
+import uuid
+from collections import defaultdict
+
+from django.apps import apps
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 
+from twitter.cache import (
+    COUNT_DELTAS_FLUSH_LOCK_KEY,
+    COUNT_DELTAS_FLUSHING_KEY,
+    COUNT_DELTAS_KEY,
+)
 from utils.redis_client import RedisClient
-from utils.redis_serializers import DjangoModelSerializer
+from utils.redis_serializers import InvalidSerializedData, get_serializer
 
 conn = RedisClient.get_connection()
 
+FILL_WAIT_INTERVAL = 0.02  # in seconds
+# the cached id sets always have this member, so that an empty set is cached
+ID_SET_SENTINEL = 0
+ID_SET_CHUNK_SIZE = 1000
+# the field of the flush id in the hash of the deltas being flushed, the
+# fields of the deltas are "{model label},{attr},{id}"
+COUNT_DELTAS_FLUSH_ID_FIELD = "flush_id"
+
+# delete the lock only if it is still held by the same token
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# extend the lock only if it is still held by the same token
+EXTEND_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("EXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# replace the id set by the one filled aside, unless it is cached already
+SWAP_ID_SET_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    return redis.call("DEL", KEYS[2])
+end
+redis.call("RENAME", KEYS[2], KEYS[1])
+return redis.call("EXPIRE", KEYS[1], ARGV[1])
+"""
+
+# push the object if the list is cached, otherwise mark the list being filled
+# as dirty, only if it is being filled
+PUSH_OBJECT_SCRIPT = """
+if redis.call("LPUSHX", KEYS[1], ARGV[1]) > 0 then
+    redis.call("LTRIM", KEYS[1], 0, ARGV[2] - 1)
+    return 1
+end
+if redis.call("EXISTS", KEYS[2]) == 1 then
+    redis.call("SET", KEYS[3], 1, "EX", ARGV[3])
+end
+return 0
+"""
+
+# change the id set only if it is cached, otherwise mark the set being filled
+# as dirty, only if it is being filled, it may miss the change
+CHANGE_ID_SET_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    return redis.call(ARGV[1], KEYS[1], ARGV[2])
+end
+if redis.call("EXISTS", KEYS[3]) == 1 then
+    redis.call("SET", KEYS[2], 1, "EX", ARGV[3])
+end
+return 0
+"""
+
+# change the counter only if it is cached. on a miss, bump the version of the
+# counter, so that the loads from db which may miss the change are not cached,
+# and return nil
+CHANGE_COUNT_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    return redis.call("INCRBY", KEYS[1], ARGV[1])
+end
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[2])
+return nil
+"""
+
+# log the delta to be flushed to db, and change the counter like above
+BUFFER_COUNT_SCRIPT = """
+redis.call("HINCRBY", KEYS[3], ARGV[3], ARGV[1])
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    return redis.call("INCRBY", KEYS[1], ARGV[1])
+end
+redis.call("INCR", KEYS[2])
+redis.call("EXPIRE", KEYS[2], ARGV[2])
+return nil
+"""
+
+# cache the counter loaded from db unless another request did it first, or
+# the counter was changed since the load started (the version is not the one
+# read before the load). return the cached counter, nil if not cached
+INIT_COUNT_SCRIPT = """
+if (redis.call("GET", KEYS[2]) or "0") ~= ARGV[2] then
+    return nil
+end
+redis.call("SET", KEYS[1], ARGV[1], "NX", "EX", ARGV[3])
+return tonumber(redis.call("GET", KEYS[1]))
+"""
+
 
 class RedisHelper:
     @classmethod
     def _load_objects_to_cache(cls, key, objects):
         conn = RedisClient.get_connection()
+        serializer = get_serializer(key)
 
+        # the queryset is sliced, so that no more rows than the limit are read
+        objects = list(objects[: settings.REDIS_LIST_LENGTH_LIMIT])
         serialized_list = []
-        for obj in objects[: settings.REDIS_LIST_LENGTH_LIMIT]:
-            serialized_data = DjangoModelSerializer.serialize(obj)
+        for obj in objects:
+            serialized_data = serializer.serialize(obj)
             serialized_list.append(serialized_data)
 
         if serialized_list:
-            conn.rpush(key, *serialized_list)
-            conn.expire(key, settings.REDIS_KEY_EXPIRE_TIME)
+            # replace the list atomically, the readers never see a half list
+            pipeline = conn.pipeline()
+            pipeline.delete(key)
+            pipeline.rpush(key, *serialized_list)
+            pipeline.expire(key, settings.REDIS_KEY_EXPIRE_TIME)
+            pipeline.execute()
+        return objects
 
     @classmethod
-    def load_objects(cls, key, queryset):
+    def _get_cached_objects(cls, key, model_class, size=None):
+        # return None if the key is not cached, the first size objects if size
+        # is given
         conn = RedisClient.get_connection()
+        if not conn.exists(key):
+            return None
+        serializer = get_serializer(key)
+        serialized_list = conn.lrange(key, 0, -1 if size is None else size - 1)
+        try:
+            return [
+                serializer.deserialize(serialized_data, model_class)
+                for serialized_data in serialized_list
+            ]
+        except InvalidSerializedData:
+            # cached by an old schema, reload it from db
+            conn.delete(key)
+            return None
 
+    @classmethod
+    def get_fill_lock_key(cls, key):
+        return f"{key}:fill_lock"
+
+    @classmethod
+    def get_fill_dirty_key(cls, key):
+        return f"{key}:fill_dirty"
+
+    @classmethod
+    def _fill_cache(cls, key, queryset):
+        # single flight: only the request holding the lock loads the list from
+        # db, return the loaded objects, None if another request is loading it
+        conn = RedisClient.get_connection()
+        lock_key = cls.get_fill_lock_key(key)
+        dirty_key = cls.get_fill_dirty_key(key)
+        token = uuid.uuid4().hex
+        if not conn.set(
+            lock_key, token, nx=True, ex=settings.REDIS_FILL_LOCK_EXPIRE_TIME
+        ):
+            return None
+        try:
+            conn.delete(dirty_key)
+            objects = cls._load_objects_to_cache(key, queryset)
+            # objects were pushed while loading, the list may miss them
+            if conn.exists(dirty_key):
+                conn.delete(key)
+        finally:
+            conn.register_script(RELEASE_LOCK_SCRIPT)(keys=[lock_key], args=[token])
+        return objects
+
+    @classmethod
+    def _wait_for_fill(cls, key):
+        # wait briefly until the request holding the lock loads the list
+        conn = RedisClient.get_connection()
+        lock_key = cls.get_fill_lock_key(key)
+        deadline = time.monotonic() + settings.REDIS_FILL_WAIT_TIME
+        while time.monotonic() < deadline and conn.exists(lock_key):
+            time.sleep(FILL_WAIT_INTERVAL)
+
+    @classmethod
+    def _mark_fill_dirty(cls, keys):
+        # the list being loaded may miss the objects just pushed, let the
+        # loading request drop it, and drop the one already loaded
+        conn = RedisClient.get_connection()
+        pipeline = conn.pipeline(transaction=False)
+        for key in keys:
+            pipeline.set(
+                cls.get_fill_dirty_key(key),
+                1,
+                ex=settings.REDIS_FILL_LOCK_EXPIRE_TIME,
+            )
+            pipeline.delete(key)
+        pipeline.execute()
+
+    @classmethod
+    def load_objects(cls, key, queryset):
         # if hit cache, get the data
-        if conn.exists(key):
-            # cache hit
-            serialized_list = conn.lrange(key, 0, -1)
-            objects = []
-            for serialized_data in serialized_list:
-                deserialized_obj = DjangoModelSerializer.deserialize(serialized_data)
-                objects.append(deserialized_obj)
+        objects = cls._get_cached_objects(key, queryset.model)
+        if objects is not None:
             return objects
 
-        # cache miss
-        cls._load_objects_to_cache(key, queryset)
-        # convert to list, because of the response
-        return list(queryset)
+        # cache miss, only one request loads the list into cache
+        objects = cls._fill_cache(key, queryset)
+        if objects is not None:
+            return objects
+        cls._wait_for_fill(key)
+        objects = cls._get_cached_objects(key, queryset.model)
+        if objects is not None:
+            return objects
+        # the list is not loaded in time, read the same rows as the cached ones
+        return list(queryset[: settings.REDIS_LIST_LENGTH_LIMIT])
+
+    @classmethod
+    def load_first_objects(cls, key, queryset, size):
+        # the first size objects of the cached list, a miss reads them from db
+        # without loading the whole list into cache
+        objects = cls._get_cached_objects(key, queryset.model, size)
+        if objects is not None:
+            return objects
+        return list(queryset[:size])
+
+    @classmethod
+    def invalidate_objects(cls, key):
+        # also drop the list which is being loaded, it may be out of date
+        cls._mark_fill_dirty([key])
 
     @classmethod
     def push_object(cls, key, obj, queryset):
         conn = RedisClient.get_connection()
-        if not conn.exists(key):
-            # if key is not exist, get the data from db
-            cls._load_objects_to_cache(key, queryset)
+        serialized_data = get_serializer(key).serialize(obj)
+        # LPUSHX does nothing if the key is not exist
+        if conn.lpushx(key, serialized_data):
+            # key , start, end --> newdata, olddata
+            conn.ltrim(key, 0, settings.REDIS_LIST_LENGTH_LIMIT - 1)
             return
-        serialized_data = DjangoModelSerializer.serialize(obj)
-        conn.lpush(key, serialized_data)
-        # key , start, end --> newdata, olddata
-        conn.ltrim(key, 0, settings.REDIS_LIST_LENGTH_LIMIT - 1)
+        # if key is not exist, get the data from db
+        if cls._fill_cache(key, queryset) is None:
+            cls._mark_fill_dirty([key])
+
+    @classmethod
+    def push_objects(cls, key_object_pairs):
+        # push a batch of (key, obj) in one round trip, the keys which are not
+        # cached are skipped, they will be loaded from db when reading. only
+        # the ones being filled are marked dirty, in the same script
+        conn = RedisClient.get_connection()
+        script = conn.register_script(PUSH_OBJECT_SCRIPT)
+        pipeline = conn.pipeline(transaction=False)
+        for key, obj in key_object_pairs:
+            script(
+                keys=[key, cls.get_fill_lock_key(key), cls.get_fill_dirty_key(key)],
+                args=[
+                    get_serializer(key).serialize(obj),
+                    settings.REDIS_LIST_LENGTH_LIMIT,
+                    settings.REDIS_FILL_LOCK_EXPIRE_TIME,
+                ],
+                client=pipeline,
+            )
+        pipeline.execute()
 
     @classmethod
     def get_count_key(cls, obj, attr):
-        return f"{obj.__class__.__name__.lower()}, {attr}, {obj.id}"
+        return cls._get_count_key(obj.__class__, obj.id, attr)
 
     @classmethod
-    def increase_count(cls, obj, attr):
+    def _get_count_key(cls, model_class, object_id, attr):
+        return f"{model_class.__name__.lower()}, {attr}, {object_id}"
+
+    @classmethod
+    def get_count_version_key(cls, key):
+        return f"{key}:version"
+
+    @classmethod
+    def get_count_delta_field(cls, model_class, object_id, attr):
+        return f"{model_class._meta.label_lower},{attr},{object_id}"
+
+    @classmethod
+    def _load_counts_from_db(cls, model_class, object_ids, attr):
+        counts = dict(
+            model_class.objects.filter(id__in=object_ids).values_list("id", attr)
+        )
+        if not settings.COUNTERS_WRITE_BEHIND or not counts:
+            return counts
+        # the db counts miss the deltas which are not flushed yet
         conn = RedisClient.get_connection()
-        key = cls.get_count_key(obj, attr)
-        if not conn.exists(key):
-            # if key is not exist, get the data from db
-            obj.refresh_from_db()
-            conn.set(key, getattr(obj, attr))
-            conn.expire(key, settings.REDIS_KEY_EXPIRE_TIME)
-            return getattr(obj, attr)
-        return conn.incr(key)
+        fields = [
+            cls.get_count_delta_field(model_class, object_id, attr)
+            for object_id in counts
+        ]
+        pipeline = conn.pipeline(transaction=False)
+        pipeline.hmget(COUNT_DELTAS_KEY, fields)
+        pipeline.hmget(
+            COUNT_DELTAS_FLUSHING_KEY, [COUNT_DELTAS_FLUSH_ID_FIELD] + fields
+        )
+        pending_deltas, (flush_id, *flushing_deltas) = pipeline.execute()
+        # the flushing deltas are in the db counts once their flush committed
+        if flush_id and cls._is_flush_committed(flush_id.decode()):
+            flushing_deltas = [None] * len(fields)
+        for object_id, pending_delta, flushing_delta in zip(
+            list(counts), pending_deltas, flushing_deltas
+        ):
+            counts[object_id] += int(pending_delta or 0) + int(flushing_delta or 0)
+        return counts
 
     @classmethod
-    def decrease_count(cls, obj, attr):
+    def _is_flush_committed(cls, flush_id):
+        CountDeltasFlush = apps.get_model("core", "CountDeltasFlush")
+        return CountDeltasFlush.objects.filter(flush_id=flush_id).exists()
+
+    @classmethod
+    def _bump_count_versions(cls, pipeline, keys):
+        # the loads from db which started before are not cached
+        for key in keys:
+            version_key = cls.get_count_version_key(key)
+            pipeline.incr(version_key)
+            pipeline.expire(version_key, settings.REDIS_KEY_EXPIRE_TIME)
+
+    @classmethod
+    def _change_count(cls, obj, attr, delta):
         conn = RedisClient.get_connection()
         key = cls.get_count_key(obj, attr)
-        if not conn.exists(key):
-            # if key is not exist, get the data from db
-            obj.refresh_from_db()
-            conn.set(key, getattr(obj, attr))
-            conn.expire(key, settings.REDIS_KEY_EXPIRE_TIME)
-            return getattr(obj, attr)
-        return conn.decr(key)
+        version_key = cls.get_count_version_key(key)
+        if settings.COUNTERS_WRITE_BEHIND:
+            # log the delta with the counter in one script, the db is updated
+            # by flush_count_deltas
+            script = conn.register_script(BUFFER_COUNT_SCRIPT)
+            field = cls.get_count_delta_field(obj.__class__, obj.id, attr)
+            count = script(
+                keys=[key, version_key, COUNT_DELTAS_KEY],
+                args=[delta, settings.REDIS_KEY_EXPIRE_TIME, field],
+            )
+        else:
+            script = conn.register_script(CHANGE_COUNT_SCRIPT)
+            count = script(
+                keys=[key, version_key],
+                args=[delta, settings.REDIS_KEY_EXPIRE_TIME],
+            )
+        if count is not None:
+            return count
+        # if key is not exist, get the data from db, the db is updated (or the
+        # delta is logged) before, so the loaded count includes the delta
+        return cls.get_counts([obj], attr).get(obj.id)
+
+    @classmethod
+    def change_cached_counts(cls, key_delta_pairs):
+        # change the counters which are cached in one round trip, the missed
+        # ones are loaded from db when reading
+        conn = RedisClient.get_connection()
+        script = conn.register_script(CHANGE_COUNT_SCRIPT)
+        pipeline = conn.pipeline(transaction=False)
+        for key, delta in key_delta_pairs:
+            script(
+                keys=[key, cls.get_count_version_key(key)],
+                args=[delta, settings.REDIS_KEY_EXPIRE_TIME],
+                client=pipeline,
+            )
+        pipeline.execute()
+
+    @classmethod
+    def init_cached_counts(cls, key_count_version_triples):
+        # cache the counts loaded from db, the versions are read with the
+        # counters before the load. return the cached counts, None for the
+        # ones changed while loading
+        conn = RedisClient.get_connection()
+        script = conn.register_script(INIT_COUNT_SCRIPT)
+        pipeline = conn.pipeline(transaction=False)
+        for key, count, version in key_count_version_triples:
+            script(
+                keys=[key, cls.get_count_version_key(key)],
+                args=[count, version or 0, settings.REDIS_KEY_EXPIRE_TIME],
+                client=pipeline,
+            )
+        return pipeline.execute()
+
+    @classmethod
+    def invalidate_cached_counts(cls, keys):
+        # drop the counters and bump their versions, so that the loads from db
+        # which started before the invalidation are not cached
+        conn = RedisClient.get_connection()
+        pipeline = conn.pipeline()
+        for key in keys:
+            pipeline.delete(key)
+        cls._bump_count_versions(pipeline, keys)
+        pipeline.execute()
+
+    @classmethod
+    def get_cached_count(cls, key, load_count):
+        # the counters which are not the fields of a model, load_count reads
+        # the count from db on a miss. one MGET of the counter and its version
+        conn = RedisClient.get_connection()
+        count, version = conn.mget([key, cls.get_count_version_key(key)])
+        if count is not None:
+            return int(count)
+        count = load_count()
+        (cached_count,) = cls.init_cached_counts([(key, count, version)])
+        return count if cached_count is None else cached_count
+
+    @classmethod
+    def increase_count(cls, obj, attr):
+        return cls._change_count(obj, attr, 1)
+
+    @classmethod
+    def decrease_count(cls, obj, attr):
+        return cls._change_count(obj, attr, -1)
 
     @classmethod
     def get_count(cls, obj, attr):
+        return cls.get_counts([obj], attr)[obj.id]
+
+    @classmethod
+    def get_counts(cls, objs, attr):
+        # one MGET for the cached counts with their versions, and one db query
+        # for the misses
+        if not objs:
+            return {}
         conn = RedisClient.get_connection()
-        key = cls.get_count_key(obj, attr)
-        if conn.get(key):
-            return int(conn.get(key))
+        model_class = objs[0].__class__
+        object_ids = list(dict.fromkeys(obj.id for obj in objs))
+        keys = [
+            cls._get_count_key(model_class, object_id, attr) for object_id in object_ids
+        ]
+        values = conn.mget(keys + [cls.get_count_version_key(key) for key in keys])
+        counts, versions = {}, {}
+        for object_id, count, version in zip(
+            object_ids, values[: len(keys)], values[len(keys) :]
+        ):
+            if count is not None:
+                counts[object_id] = int(count)
+            else:
+                versions[object_id] = version
+
+        if not versions:
+            return counts
+        missed_counts = cls._load_counts_from_db(model_class, list(versions), attr)
+        cached_counts = cls.init_cached_counts(
+            [
+                (
+                    cls._get_count_key(model_class, object_id, attr),
+                    count,
+                    versions[object_id],
+                )
+                for object_id, count in missed_counts.items()
+            ]
+        )
+        # the counters cached by other requests are newer than our db read
+        for object_id, cached_count in zip(list(missed_counts), cached_counts):
+            if cached_count is not None:
+                missed_counts[object_id] = cached_count
+        counts.update(missed_counts)
+        return counts
+
+    @classmethod
+    def acquire_flush_lock(cls):
+        # return the token of the lock, None if another flush holds it
+        conn = RedisClient.get_connection()
+        token = uuid.uuid4().hex
+        if not conn.set(
+            COUNT_DELTAS_FLUSH_LOCK_KEY,
+            token,
+            nx=True,
+            ex=settings.COUNT_DELTAS_FLUSH_LOCK_EXPIRE_TIME,
+        ):
+            return None
+        return token
+
+    @classmethod
+    def extend_flush_lock(cls, token):
+        # return False if the lock expired and may be held by another flush
+        conn = RedisClient.get_connection()
+        script = conn.register_script(EXTEND_LOCK_SCRIPT)
+        return bool(
+            script(
+                keys=[COUNT_DELTAS_FLUSH_LOCK_KEY],
+                args=[token, settings.COUNT_DELTAS_FLUSH_LOCK_EXPIRE_TIME],
+            )
+        )
 
-        obj.refresh_from_db()
-        count = getattr(obj, attr)
-        conn.set(key, count)
-        return count
+    @classmethod
+    def release_flush_lock(cls, token):
+        conn = RedisClient.get_connection()
+        script = conn.register_script(RELEASE_LOCK_SCRIPT)
+        script(keys=[COUNT_DELTAS_FLUSH_LOCK_KEY], args=[token])
+
+    @classmethod
+    def discard_count_deltas(cls, model_class, object_ids, attr):
+        # drop the logged deltas and the cached counters of the objects whose
+        # db counts were just recounted, and bump the versions of the counters
+        # so that the loads in progress are not cached. the caller holds the
+        # flush lock
+        conn = RedisClient.get_connection()
+        fields = [
+            cls.get_count_delta_field(model_class, object_id, attr)
+            for object_id in object_ids
+        ]
+        keys = [
+            cls._get_count_key(model_class, object_id, attr) for object_id in object_ids
+        ]
+        pipeline = conn.pipeline()
+        pipeline.hdel(COUNT_DELTAS_KEY, *fields)
+        pipeline.hdel(COUNT_DELTAS_FLUSHING_KEY, *fields)
+        pipeline.delete(*keys)
+        cls._bump_count_versions(pipeline, keys)
+        pipeline.execute()
+
+    @classmethod
+    def flush_count_deltas(cls):
+        token = cls.acquire_flush_lock()
+        if token is None:
+            return 0
+        try:
+            return cls.apply_count_deltas()
+        finally:
+            cls.release_flush_lock(token)
+
+    @classmethod
+    def apply_count_deltas(cls):
+        # the caller holds the flush lock. move the logged deltas aside with a
+        # flush id, apply them to db with the id in one transaction, then drop
+        # them. if the flush crashes, the moved deltas are applied by the next
+        # flush, unless the id shows they were committed
+        conn = RedisClient.get_connection()
+        if not conn.exists(COUNT_DELTAS_FLUSHING_KEY):
+            if not conn.exists(COUNT_DELTAS_KEY):
+                return 0
+            pipeline = conn.pipeline()
+            pipeline.rename(COUNT_DELTAS_KEY, COUNT_DELTAS_FLUSHING_KEY)
+            pipeline.hset(
+                COUNT_DELTAS_FLUSHING_KEY, COUNT_DELTAS_FLUSH_ID_FIELD, uuid.uuid4().hex
+            )
+            pipeline.execute()
+
+        deltas = conn.hgetall(COUNT_DELTAS_FLUSHING_KEY)
+        flush_id = deltas.pop(COUNT_DELTAS_FLUSH_ID_FIELD.encode(), b"").decode()
+        if flush_id and cls._is_flush_committed(flush_id):
+            cls._drop_flushing_deltas(deltas)
+            return 0
+
+        # the rows with the same delta are updated in one query
+        object_ids_by_delta = defaultdict(list)
+        for field, delta in deltas.items():
+            label, attr, object_id = field.decode().split(",")
+            if int(delta):
+                object_ids_by_delta[(label, attr, int(delta))].append(int(object_id))
+        CountDeltasFlush = apps.get_model("core", "CountDeltasFlush")
+        with transaction.atomic():
+            for (label, attr, delta), object_ids in object_ids_by_delta.items():
+                apps.get_model(label).objects.filter(id__in=object_ids).update(
+                    **{attr: F(attr) + delta}
+                )
+            # only the id of the last flush is needed
+            if flush_id:
+                CountDeltasFlush.objects.all().delete()
+                CountDeltasFlush.objects.create(flush_id=flush_id)
+        cls._drop_flushing_deltas(deltas)
+        return len(deltas)
+
+    @classmethod
+    def _drop_flushing_deltas(cls, deltas):
+        # the deltas are committed to db. bump the versions of their counters
+        # before dropping them, a load which read the db before the commit
+        # misses the deltas, it must not be cached
+        conn = RedisClient.get_connection()
+        keys = []
+        for field in deltas:
+            label, attr, object_id = field.decode().split(",")
+            keys.append(cls._get_count_key(apps.get_model(label), object_id, attr))
+        pipeline = conn.pipeline()
+        cls._bump_count_versions(pipeline, keys)
+        pipeline.execute()
+        conn.delete(COUNT_DELTAS_FLUSHING_KEY)
+
+    @classmethod
+    def _fill_id_set(cls, key, iter_ids):
+        # single flight like _fill_cache, return False if another request is
+        # filling the set. the set is filled in a temporary key chunk by chunk,
+        # so that neither the readers see a half set nor the memory grows with
+        # the size of the set, the lock is extended for every chunk
+        conn = RedisClient.get_connection()
+        lock_key = cls.get_fill_lock_key(key)
+        dirty_key = cls.get_fill_dirty_key(key)
+        token = uuid.uuid4().hex
+        expire_time = settings.REDIS_FILL_LOCK_EXPIRE_TIME
+        if not conn.set(lock_key, token, nx=True, ex=expire_time):
+            return False
+        extend_lock = conn.register_script(EXTEND_LOCK_SCRIPT)
+        filling_key = f"{key}:filling:{uuid.uuid4().hex}"
+        try:
+            conn.delete(dirty_key)
+            chunk = [ID_SET_SENTINEL]
+            for object_id in iter_ids():
+                chunk.append(object_id)
+                if len(chunk) == ID_SET_CHUNK_SIZE:
+                    conn.sadd(filling_key, *chunk)
+                    conn.expire(filling_key, expire_time)
+                    extend_lock(keys=[lock_key], args=[token, expire_time])
+                    chunk = []
+            if chunk:
+                conn.sadd(filling_key, *chunk)
+            script = conn.register_script(SWAP_ID_SET_SCRIPT)
+            script(keys=[key, filling_key], args=[settings.REDIS_KEY_EXPIRE_TIME])
+            # the set was changed while filling, drop it
+            if conn.exists(dirty_key):
+                conn.delete(key)
+        finally:
+            conn.delete(filling_key)
+            conn.register_script(RELEASE_LOCK_SCRIPT)(keys=[lock_key], args=[token])
+        return True
+
+    @classmethod
+    def _load_id_set(cls, key, iter_ids):
+        # fill the missed set, or wait briefly for the request filling it
+        if not cls._fill_id_set(key, iter_ids):
+            cls._wait_for_fill(key)
+
+    @classmethod
+    def get_id_set(cls, key, iter_ids):
+        # iter_ids streams the ids from db, it is called only on a miss. the
+        # cached set always has the sentinel, an empty result is a miss
+        conn = RedisClient.get_connection()
+        members = conn.smembers(key)
+        if not members:
+            cls._load_id_set(key, iter_ids)
+            members = conn.smembers(key)
+            if not members:
+                return set(iter_ids())
+        return {int(member) for member in members} - {ID_SET_SENTINEL}
+
+    @classmethod
+    def get_id_set_membership(cls, key, iter_ids, object_ids, load_members):
+        # check the ids with one SMISMEMBER, return {id: bool}. load_members
+        # reads the members among object_ids from db if the set is not loaded
+        conn = RedisClient.get_connection()
+        object_ids = list(object_ids)
+        results = conn.smismember(key, [ID_SET_SENTINEL] + object_ids)
+        if not results[0]:
+            cls._load_id_set(key, iter_ids)
+            results = conn.smismember(key, [ID_SET_SENTINEL] + object_ids)
+            if not results[0]:
+                member_ids = load_members(object_ids)
+                results = [True] + [object_id in member_ids for object_id in object_ids]
+        return {
+            object_id: bool(result)
+            for object_id, result in zip(object_ids, results[1:])
+        }
+
+    @classmethod
+    def _change_id_set(cls, command, key, object_id):
+        conn = RedisClient.get_connection()
+        script = conn.register_script(CHANGE_ID_SET_SCRIPT)
+        script(
+            keys=[key, cls.get_fill_dirty_key(key), cls.get_fill_lock_key(key)],
+            args=[command, object_id, settings.REDIS_FILL_LOCK_EXPIRE_TIME],
+        )
+
+    @classmethod
+    def add_to_id_set(cls, key, object_id):
+        cls._change_id_set("SADD", key, object_id)
+
+    @classmethod
+    def remove_from_id_set(cls, key, object_id):
+        cls._change_id_set("SREM", key, object_id)
@@ -1,8 +1,16 @@
+import zlib
+
+import msgpack
 from django.core import serializers
 
+from twitter.cache import REDIS_LIST_SERIALIZERS
 from utils.json_encoder import JSONEncoder
 
 
+class InvalidSerializedData(ValueError):
+    pass
+
+
 class DjangoModelSerializer:
     @classmethod
     def serialize(cls, instance):
@@ -11,6 +19,88 @@ class DjangoModelSerializer:
         return serializers.serialize("json", [instance], cls=JSONEncoder)
 
     @classmethod
-    def deserialize(cls, serialized_data):
+    def deserialize(cls, serialized_data, model_class=None):
         # need .object to convert to the instance
         return list(serializers.deserialize("json", serialized_data))[0].object
+
+
+class CompactModelSerializer:
+    """
+    Serialize the instance as a msgpack array of its field values,
+    [schema_version, value1, value2, ...], the field names are not stored.
+    Only the fields in field_names are stored if it is given, the others are
+    deferred on the deserialized instance.
+    """
+
+    # bump it when the format of the values changes
+    FORMAT_VERSION = 1
+
+    def __init__(self, field_names=None):
+        self.field_names = field_names
+        self._fields = {}
+        self._schema_versions = {}
+
+    def get_fields(self, model_class):
+        if model_class not in self._fields:
+            fields = model_class._meta.concrete_fields
+            if self.field_names is not None:
+                fields = [
+                    field for field in fields if field.attname in self.field_names
+                ]
+            self._fields[model_class] = fields
+        return self._fields[model_class]
+
+    def get_schema_version(self, model_class):
+        # the version changes with the fields of the model, so that the data
+        # cached before a migration would not be decoded into the wrong fields
+        if model_class not in self._schema_versions:
+            attnames = [field.attname for field in self.get_fields(model_class)]
+            schema = f"{self.FORMAT_VERSION}:{','.join(attnames)}"
+            self._schema_versions[model_class] = zlib.crc32(schema.encode())
+        return self._schema_versions[model_class]
+
+    def serialize(self, instance):
+        values = [self.get_schema_version(instance.__class__)]
+        for field in self.get_fields(instance.__class__):
+            values.append(field.get_prep_value(getattr(instance, field.attname)))
+        return msgpack.packb(values, datetime=True)
+
+    def deserialize(self, serialized_data, model_class):
+        try:
+            values = msgpack.unpackb(serialized_data, timestamp=3)
+        except (TypeError, ValueError, msgpack.UnpackException):
+            raise InvalidSerializedData("data is not serialized by msgpack")
+        fields = self.get_fields(model_class)
+        if (
+            not isinstance(values, list)
+            or len(values) != len(fields) + 1
+            or values[0] != self.get_schema_version(model_class)
+        ):
+            raise InvalidSerializedData(f"schema of {model_class.__name__} changed")
+        return model_class.from_db(
+            None,
+            [field.attname for field in fields],
+            values[1:],
+        )
+
+
+SERIALIZERS = {
+    "django": DjangoModelSerializer,
+    "compact": CompactModelSerializer(),
+}
+_pattern_serializers = {}
+
+
+def get_serializer(key):
+    # select the serializer by the key pattern defined in twitter/cache.py
+    for pattern, config in REDIS_LIST_SERIALIZERS.items():
+        if not key.startswith(pattern.split("{")[0]):
+            continue
+        if pattern not in _pattern_serializers:
+            if config["format"] == "compact":
+                serializer = CompactModelSerializer(config.get("fields"))
+            else:
+                serializer = SERIALIZERS[config["format"]]
+            _pattern_serializers[pattern] = serializer
+        return _pattern_serializers[pattern]
+    return DjangoModelSerializer
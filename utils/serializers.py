@@ -0,0 +1,34 @@
+from django.db import models
+from rest_framework import serializers
+
+from utils.redis_helper import RedisHelper
+
+
+class PrimedListSerializer(serializers.ListSerializer):
+    """
+    Pass the whole page to child.prime(instances) before rendering it, so that
+    the child serializer can load the related objects of the page in bulk
+    instead of one cache or db round trip per row.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        instances = list(iterable)
+        self.child.prime(instances)
+        return super().to_representation(instances)
+
+
+class CachedCountsMixin:
+    def prime_counts(self: serializers.Serializer, instances, *attrs):
+        # keep the redis counters of the whole page in the context, so that
+        # get_cached_count does not call redis for each row
+        counts_map = self.context.setdefault("counts_map", {})
+        for attr in attrs:
+            for object_id, count in RedisHelper.get_counts(instances, attr).items():
+                counts_map[(instances[0].__class__, attr, object_id)] = count
+
+    def get_cached_count(self: serializers.Serializer, obj, attr):
+        counts_map = self.context.get("counts_map", {})
+        if (obj.__class__, attr, obj.id) in counts_map:
+            return counts_map[(obj.__class__, attr, obj.id)]
+        return RedisHelper.get_count(obj, attr)
@@ -1,5 +1,22 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import RequestFactory, override_settings
+
 from testing.testcases import TestCase
+from tweets.models import Tweet
+from twitter.cache import USER_TWEETS_PATTERN
+from utils.memcached_helper import MemcachedHelper
+from utils.memcached_helper import cache as memcached
+from utils.middlewares import IdentityMapMiddleware
 from utils.redis_client import RedisClient
+from utils.redis_helper import CHANGE_COUNT_SCRIPT, RedisHelper
+from utils.redis_serializers import (
+    CompactModelSerializer,
+    DjangoModelSerializer,
+    InvalidSerializedData,
+    get_serializer,
+)
 
 
 class UtilsTests(TestCase):
@@ -16,3 +33,204 @@ class UtilsTests(TestCase):
         RedisClient.clear()
         cached_list = conn.lrange("redis_key", 0, -1)
         self.assertEqual(cached_list, [])
+
+    def test_push_objects(self):
+        user = self.create_user("user1", "user1@example.com")
+        tweets = [self.create_tweet(user, f"tweet{i}") for i in range(3)]
+        conn = RedisClient.get_connection()
+        conn.rpush("cached_key", DjangoModelSerializer.serialize(tweets[0]))
+
+        RedisHelper.push_objects(
+            [
+                ("cached_key", tweets[1]),
+                ("not_cached_key", tweets[1]),
+                ("cached_key", tweets[2]),
+            ]
+        )
+        cached_list = conn.lrange("cached_key", 0, -1)
+        self.assertEqual(
+            [DjangoModelSerializer.deserialize(data).id for data in cached_list],
+            [tweets[2].id, tweets[1].id, tweets[0].id],
+        )
+        # the keys which are not cached are skipped
+        self.assertEqual(conn.exists("not_cached_key"), False)
+        self.assertFalse(conn.exists(RedisHelper.get_fill_dirty_key("not_cached_key")))
+
+        # the list being filled may miss the object, it is marked dirty
+        conn.set(RedisHelper.get_fill_lock_key("not_cached_key"), "token")
+        RedisHelper.push_objects([("not_cached_key", tweets[2])])
+        self.assertEqual(conn.exists("not_cached_key"), False)
+        self.assertTrue(conn.exists(RedisHelper.get_fill_dirty_key("not_cached_key")))
+
+    def test_compact_model_serializer(self):
+        user = self.create_user("user1", "user1@example.com")
+        tweet = self.create_tweet(user, "tweet content")
+        serializer = CompactModelSerializer()
+        serialized_data = serializer.serialize(tweet)
+        self.assertLess(
+            len(serialized_data), len(DjangoModelSerializer.serialize(tweet))
+        )
+
+        cached_tweet = serializer.deserialize(serialized_data, Tweet)
+        self.assertEqual(cached_tweet, tweet)
+        self.assertEqual(cached_tweet.user_id, user.id)
+        self.assertEqual(cached_tweet.content, "tweet content")
+        self.assertEqual(cached_tweet.created_at, tweet.created_at)
+
+        # the data of other formats can not be decoded
+        with self.assertRaises(InvalidSerializedData):
+            serializer.deserialize(DjangoModelSerializer.serialize(tweet), Tweet)
+
+        # only the given fields are stored, the others are deferred
+        serializer = CompactModelSerializer(("id", "created_at"))
+        cached_tweet = serializer.deserialize(serializer.serialize(tweet), Tweet)
+        self.assertEqual(cached_tweet.id, tweet.id)
+        self.assertEqual(cached_tweet.created_at, tweet.created_at)
+        self.assertEqual(
+            cached_tweet.get_deferred_fields(),
+            {"user_id", "content", "likes_count", "comments_count"},
+        )
+
+    def test_load_objects_with_invalid_serialized_data(self):
+        user = self.create_user("user1", "user1@example.com")
+        tweet = self.create_tweet(user)
+        key = USER_TWEETS_PATTERN.format(user_id=user.id)
+        serializer = get_serializer(key)
+        self.assertIsInstance(serializer, CompactModelSerializer)
+
+        # the list cached by the old format is reloaded from db
+        RedisClient.clear()
+        conn = RedisClient.get_connection()
+        conn.rpush(key, DjangoModelSerializer.serialize(tweet))
+        queryset = Tweet.objects.filter(user_id=user.id).order_by("-created_at")
+        self.assertEqual(RedisHelper.load_objects(key, queryset), [tweet])
+        self.assertEqual(RedisHelper.load_objects(key, queryset), [tweet])
+        self.assertEqual(conn.lrange(key, 0, -1), [serializer.serialize(tweet)])
+
+    @override_settings(REDIS_FILL_WAIT_TIME=0)
+    def test_load_objects_single_flight(self):
+        user = self.create_user("user1", "user1@example.com")
+        tweet = self.create_tweet(user)
+        key = USER_TWEETS_PATTERN.format(user_id=user.id)
+        lock_key = RedisHelper.get_fill_lock_key(key)
+        queryset = Tweet.objects.filter(user_id=user.id).order_by("-created_at")
+        RedisClient.clear()
+        conn = RedisClient.get_connection()
+
+        # another request is loading the list, read db without writing cache
+        conn.set(lock_key, "token")
+        self.assertEqual(RedisHelper.load_objects(key, queryset.all()), [tweet])
+        self.assertFalse(conn.exists(key))
+
+        # the pushed object may be missed by the loading request, so the
+        # list it loads is dropped
+        new_tweet = self.create_tweet(user)
+        RedisHelper.push_object(key, new_tweet, queryset.all())
+        self.assertTrue(conn.exists(RedisHelper.get_fill_dirty_key(key)))
+
+        # the lock is released only by its holder
+        conn.delete(lock_key)
+        self.assertEqual(
+            RedisHelper.load_objects(key, queryset.all()), [new_tweet, tweet]
+        )
+        self.assertFalse(conn.exists(lock_key))
+        self.assertEqual(conn.llen(key), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                RedisHelper.load_objects(key, queryset.all()), [new_tweet, tweet]
+            )
+
+    def test_get_objects_through_cache(self):
+        users = [self.create_user(f"user{i}", f"user{i}@example.com") for i in range(3)]
+        user_ids = [user.id for user in users]
+        MemcachedHelper.get_object_through_cache(User, users[0].id)
+
+        # the cache misses are loaded with one query
+        with self.assertNumQueries(1):
+            objects = MemcachedHelper.get_objects_through_cache(User, user_ids)
+        self.assertEqual(objects, {user.id: user for user in users})
+
+        # all cached
+        with self.assertNumQueries(0):
+            objects = MemcachedHelper.get_objects_through_cache(User, user_ids)
+        self.assertEqual(objects, {user.id: user for user in users})
+
+    def test_prime_cached_objects(self):
+        users = [self.create_user(f"user{i}", f"user{i}@example.com") for i in range(3)]
+        tweets = [self.create_tweet(user) for user in users + users]
+        tweets = list(Tweet.objects.filter(id__in=[tweet.id for tweet in tweets]))
+
+        with self.assertNumQueries(1):
+            MemcachedHelper.prime_cached_objects(
+                tweets, User, "user_id", "_cached_user"
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [tweet.cached_user.id for tweet in tweets],
+                [tweet.user_id for tweet in tweets],
+            )
+
+    def test_counts(self):
+        user = self.create_user("user1", "user1@example.com")
+        tweets = [self.create_tweet(user) for _ in range(3)]
+        Tweet.objects.filter(id=tweets[0].id).update(likes_count=2)
+        conn = RedisClient.get_connection()
+
+        # the missed counters are loaded with one query
+        with self.assertNumQueries(1):
+            counts = RedisHelper.get_counts(tweets, "likes_count")
+        self.assertEqual(counts, {tweets[0].id: 2, tweets[1].id: 0, tweets[2].id: 0})
+        key = RedisHelper.get_count_key(tweets[0], "likes_count")
+        self.assertGreater(conn.ttl(key), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(RedisHelper.get_counts(tweets, "likes_count"), counts)
+            self.assertEqual(RedisHelper.increase_count(tweets[0], "likes_count"), 3)
+            self.assertEqual(RedisHelper.decrease_count(tweets[1], "likes_count"), -1)
+
+        # the db is updated before the counter, a missed counter loads it
+        RedisClient.clear()
+        Tweet.objects.filter(id=tweets[0].id).update(likes_count=3)
+        self.assertEqual(RedisHelper.increase_count(tweets[0], "likes_count"), 3)
+        self.assertEqual(RedisHelper.increase_count(tweets[0], "likes_count"), 4)
+        self.assertEqual(RedisHelper.get_count(tweets[0], "likes_count"), 4)
+
+        # the counter changed while loading it is not cached from the old count
+        RedisClient.clear()
+        load_counts_from_db = RedisHelper._load_counts_from_db
+
+        def load_counts_with_concurrent_like(*args):
+            counts = load_counts_from_db(*args)
+            # the like updates db, then finds the counter missed
+            Tweet.objects.filter(id=tweets[0].id).update(likes_count=5)
+            conn.register_script(CHANGE_COUNT_SCRIPT)(
+                keys=[key, RedisHelper.get_count_version_key(key)],
+                args=[1, 60],
+            )
+            return counts
+
+        with patch.object(
+            RedisHelper, "_load_counts_from_db", load_counts_with_concurrent_like
+        ):
+            self.assertEqual(RedisHelper.get_count(tweets[0], "likes_count"), 3)
+        self.assertFalse(conn.exists(key))
+        self.assertEqual(RedisHelper.get_count(tweets[0], "likes_count"), 5)
+
+    def test_identity_map_middleware(self):
+        user = self.create_user("user1", "user1@example.com")
+        key = MemcachedHelper.get_key(User, user.id)
+
+        def get_response(request):
+            # the user is fetched once per request, even without memcached
+            with self.assertNumQueries(1):
+                MemcachedHelper.get_object_through_cache(User, user.id)
+                memcached.delete(key)
+                MemcachedHelper.get_objects_through_cache(User, [user.id])
+                MemcachedHelper.get_object_through_cache(User, user.id)
+            return "response"
+
+        middleware = IdentityMapMiddleware(get_response)
+        self.assertEqual(middleware(RequestFactory().get("/")), "response")
+        # the map is dropped with the request
+        memcached.delete(key)
+        with self.assertNumQueries(1):
+            MemcachedHelper.get_object_through_cache(User, user.id)